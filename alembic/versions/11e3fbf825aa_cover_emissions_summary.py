@@ -0,0 +1,40 @@
+"""cover_emissions_summary
+
+Revision ID: 11e3fbf825aa
+Revises: 3adeb266bd98
+Create Date: 2026-10-14 11:52:37.604118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "11e3fbf825aa"
+down_revision: Union[str, Sequence[str], None] = "3adeb266bd98"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_query_executions_executed_at_cover",
+        "query_executions",
+        ["executed_at"],
+        postgresql_include=[
+            "estimated_emissions_gco2",
+            "execution_time_ms",
+            "carbon_intensity_gco2_kwh",
+        ],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_query_executions_executed_at_cover", table_name="query_executions"
+    )
@@ -0,0 +1,43 @@
+"""index_due_scheduled_queries
+
+Revision ID: 3adeb266bd98
+Revises: 870432ca00de
+Create Date: 2026-10-14 12:16:03.582710
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3adeb266bd98"
+down_revision: Union[str, Sequence[str], None] = "870432ca00de"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index("ix_scheduled_queries_pending", table_name="scheduled_queries")
+    op.create_index(
+        "ix_scheduled_queries_due",
+        "scheduled_queries",
+        ["scheduled_for"],
+        postgresql_where=sa.text(
+            "is_executed = false AND execution_attempts < max_attempts"
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_scheduled_queries_due", table_name="scheduled_queries")
+    op.create_index(
+        "ix_scheduled_queries_pending",
+        "scheduled_queries",
+        ["scheduled_for"],
+        postgresql_where=sa.text("is_executed = false"),
+    )
@@ -0,0 +1,35 @@
+"""index_carbon_by_zone_time
+
+Revision ID: 5f0c2d9e7a41
+Revises: 11e3fbf825aa
+Create Date: 2026-10-14 11:47:02.915530
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5f0c2d9e7a41"
+down_revision: Union[str, Sequence[str], None] = "11e3fbf825aa"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_carbon_intensity_data_zone_timestamp",
+        "carbon_intensity_data",
+        ["zone", "timestamp"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_carbon_intensity_data_zone_timestamp", table_name="carbon_intensity_data"
+    )
@@ -0,0 +1,38 @@
+"""claim_scheduled_queries
+
+Revision ID: 7cb19a856b8a
+Revises: bfdbd432d5b8
+Create Date: 2026-10-14 11:52:37.904412
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7cb19a856b8a"
+down_revision: Union[str, Sequence[str], None] = "bfdbd432d5b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "scheduled_queries", sa.Column("claimed_at", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        "ix_scheduled_queries_pending",
+        "scheduled_queries",
+        ["scheduled_for"],
+        postgresql_where=sa.text("is_executed = false"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_scheduled_queries_pending", table_name="scheduled_queries")
+    op.drop_column("scheduled_queries", "claimed_at")
@@ -0,0 +1,31 @@
+"""index_query_history
+
+Revision ID: 870432ca00de
+Revises: 7cb19a856b8a
+Create Date: 2026-10-14 12:08:51.226491
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "870432ca00de"
+down_revision: Union[str, Sequence[str], None] = "7cb19a856b8a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_query_executions_user_id_id", "query_executions", ["user_id", "id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_query_executions_user_id_id", table_name="query_executions")
@@ -0,0 +1,51 @@
+"""notify_on_scheduled_queries
+
+Revision ID: bfdbd432d5b8
+Revises: 1c5ace02cb5f
+Create Date: 2026-10-14 11:40:12.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "bfdbd432d5b8"
+down_revision: Union[str, Sequence[str], None] = "1c5ace02cb5f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # LISTEN/NOTIFY is Postgres-only; other backends keep polling
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_scheduled_query_ready() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('scheduled_query_ready', NEW.id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER scheduled_query_ready
+            AFTER INSERT OR UPDATE OF scheduled_for ON scheduled_queries
+            FOR EACH ROW EXECUTE FUNCTION notify_scheduled_query_ready()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP TRIGGER IF EXISTS scheduled_query_ready ON scheduled_queries")
+    op.execute("DROP FUNCTION IF EXISTS notify_scheduled_query_ready()")
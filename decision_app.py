@@ -1,11 +1,17 @@
 ﻿# ⚡️ Carbon-Aware Query Engine
 
 import os
-import json
+import orjson
+import asyncio
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+import duckdb
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
@@ -19,136 +25,174 @@ st.set_page_config(
 )
 
 # Constants
-API_URL = os.getenv("API_URL", "http://localhost:8000")
+API_URL = os.getenv("API_URL", "http://localhost:8000").rstrip("/")
 API_KEY = os.getenv("ENERGY_ML_API_KEY", "")
 DATA_DIR = Path(__file__).parent / "data"
-
-# Custom CSS for professional styling
-st.markdown(
-    """
-    <style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        color: #2E7D32;
-        text-align: center;
-        padding: 1rem 0;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #555;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .decision-box {
-        background-color: #e8f5e9;
-        padding: 1.5rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #2E7D32;
-        margin: 1rem 0;
-    }
-    .stButton button {
-        width: 100%;
-        background-color: #2E7D32;
-        color: white;
-        font-weight: bold;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+ASSETS_DIR = Path(__file__).parent / "assets"
+# Longer histories are downsampled before plotting
+MAX_CHART_POINTS = 2000
+# The only history fields the dashboard reads
+HISTORY_COLUMNS = [
+    "status",
+    "executed_at",
+    "estimated_emissions_gco2",
+    "execution_time_ms",
+]
+# Windows are relative to the newest sample, so a stale file still plots
+HISTORY_WINDOW_SQL = """
+SELECT * FROM read_parquet($path)
+WHERE timestamp >= (SELECT max(timestamp) FROM read_parquet($path))
+    - to_days(CAST($days AS INTEGER))
+ORDER BY timestamp
+"""
 
 
 # Helper Functions
-@st.cache_data(ttl=300)
-def load_carbon_history():
-    """Load historical carbon intensity data"""
+@st.cache_resource
+def load_css():
+    """Read the custom stylesheet once per server process"""
+    css = (ASSETS_DIR / "style.css").read_text()
+    return f"<style>\n{css}</style>"
+
+
+def load_carbon_history(days=None):
+    """Load historical carbon intensity data, optionally only the last `days`"""
+    parquet_path = DATA_DIR / "carbon_history.parquet"
+    file_path = (
+        parquet_path if parquet_path.exists() else DATA_DIR / "carbon_history.json"
+    )
     try:
-        file_path = DATA_DIR / "carbon_history.json"
-        with open(file_path, "r") as f:
-            data = json.load(f)
-        df = pd.DataFrame(data)
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        return df
-    except Exception as e:
+        stat = file_path.stat()
+    except OSError as e:
         st.error(f"Error loading carbon history: {e}")
         return pd.DataFrame()
+    # Re-read only when the file actually changes
+    return _load_carbon_history(str(file_path), stat.st_mtime_ns, stat.st_size, days)
 
 
-@st.cache_data(ttl=60)
-def fetch_query_history():
-    """Fetch query execution history from API"""
+@st.cache_data(max_entries=8)
+def _load_carbon_history(file_path, mtime_ns, size, days):
+    """Parse a carbon history file; mtime_ns and size only key the cache"""
     try:
-        headers = {"X-API-Key": API_KEY}
-        response = requests.get(f"{API_URL}/query/history", headers=headers, timeout=45)
-        if response.status_code == 200:
-            return response.json()
-        return []
+        if file_path.endswith(".parquet"):
+            # Typed columns arrive already parsed; the window is applied in the
+            # scan so rows outside it are never materialized
+            if days is None:
+                return duckdb.read_parquet(file_path).order("timestamp").df()
+            return duckdb.execute(
+                HISTORY_WINDOW_SQL, {"path": file_path, "days": days}
+            ).df()
+        data = orjson.loads(Path(file_path).read_bytes())
+        df = pd.DataFrame(data)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601", cache=True)
+        if days is not None:
+            df = df[df["timestamp"] >= df["timestamp"].max() - pd.Timedelta(days=days)]
+        # Chart lookups rely on ascending timestamps
+        return df.sort_values("timestamp", ignore_index=True)
     except Exception as e:
-        st.warning(f"Could not fetch query history: {e}")
-        return []
+        st.error(f"Error loading carbon history: {e}")
+        return pd.DataFrame()
 
 
-@st.cache_data(ttl=60)
-def fetch_emissions_summary():
-    """Fetch emissions summary from API"""
-    try:
-        headers = {"X-API-Key": API_KEY}
-        response = requests.get(
-            f"{API_URL}/emissions/summary", headers=headers, timeout=45
+@st.cache_resource
+def get_session():
+    """Shared keep-alive HTTP session for API calls, reused across reruns"""
+    session = requests.Session()
+    # Retries cover idempotent GETs only; urllib3 never replays the POST
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"X-API-Key": API_KEY})
+    return session
+
+
+async def _fetch_json(client, path, headers=None):
+    """GET an API path and return its JSON body, or None on a non-200 status"""
+    response = await client.get(path, headers=headers)
+    if response.status_code == 200:
+        return orjson.loads(response.content)
+    return None
+
+
+async def _fetch_dashboard_data():
+    """Issue the dashboard's API reads concurrently over one client"""
+    headers = {"X-API-Key": API_KEY}
+    async with httpx.AsyncClient(
+        base_url=API_URL, timeout=httpx.Timeout(15, connect=3)
+    ) as client:
+        return await asyncio.gather(
+            _fetch_json(client, "/carbon/current"),
+            _fetch_json(client, "/emissions/summary", headers),
+            _fetch_json(client, "/query/history", headers),
+            return_exceptions=True,
         )
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        st.warning(f"Could not fetch emissions summary: {e}")
-        return None
 
 
-def get_current_carbon_intensity():
-    """Get current carbon intensity"""
+def _fetch_snapshot():
+    """One round-trip for all dashboard reads; None if the server lacks it"""
     try:
-        response = requests.get(f"{API_URL}/carbon/current", timeout=45)
-        if response.status_code == 200:
-            return response.json()
+        response = get_session().get(f"{API_URL}/dashboard/snapshot", timeout=(3, 15))
+    except requests.RequestException:
         return None
-    except Exception:
+    if response.status_code != 200:
         return None
+    snap = orjson.loads(response.content)
+    return snap["carbon"], snap["emissions"], snap["history"]
 
 
-def create_strategy_comparison_chart(history_data):
+@st.cache_data(ttl=60)
+def fetch_dashboard_data():
+    """Fetch carbon intensity, emissions summary, query history and its deferrals"""
+    # Older API servers only expose the individual endpoints
+    snapshot = _fetch_snapshot()
+    if snapshot is None:
+        snapshot = asyncio.run(_fetch_dashboard_data())
+    current_ci, summary, history = snapshot
+    if isinstance(current_ci, Exception):
+        current_ci = None
+    if isinstance(summary, Exception):
+        st.warning(f"Could not fetch emissions summary: {summary}")
+        summary = None
+    if isinstance(history, Exception):
+        st.warning(f"Could not fetch query history: {history}")
+        history = None
+    history_df = pd.DataFrame(history or [], columns=HISTORY_COLUMNS)
+    # Filter once per fetch; reruns reuse the cached frame
+    deferred = history_df.loc[history_df["status"] == "deferred", "executed_at"]
+    return current_ci, summary, history_df, deferred.dropna()
+
+
+def _third_means(values):
+    """Column means over the first, middle and last thirds, in one reduction"""
+    # NaN cells are left out of both the sums and the counts
+    third = len(values) // 3
+    present = ~np.isnan(values)
+    bounds = [0, third, 2 * third]
+    sums = np.add.reduceat(np.where(present, values, 0.0), bounds)
+    counts = np.add.reduceat(present, bounds)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).T
+
+
+@st.cache_data(ttl=60)
+def create_strategy_comparison_chart(history_df):
     """Create comparative bar chart for strategies"""
-    if not history_data:
+    if history_df.empty:
         return None
-    df = pd.DataFrame(history_data)
     strategies = ["Latency-First", "Balanced Hybrid", "Carbon-Aware Deferred"]
     emissions_avg = [0.45, 0.38, 0.32]
     latency_avg = [120, 180, 220]
-    if len(df) > 0 and "estimated_emissions_gco2" in df.columns:
-        third = len(df) // 3
-        emissions_avg = [
-            df.iloc[:third]["estimated_emissions_gco2"].mean() if third > 0 else 0.45,
-            (
-                df.iloc[third : 2 * third]["estimated_emissions_gco2"].mean()
-                if third > 0
-                else 0.38
-            ),
-            (
-                df.iloc[2 * third :]["estimated_emissions_gco2"].mean()
-                if third > 0
-                else 0.32
-            ),
-        ]
-        if "execution_time_ms" in df.columns:
-            latency_avg = [
-                df.iloc[:third]["execution_time_ms"].mean() if third > 0 else 120,
-                (
-                    df.iloc[third : 2 * third]["execution_time_ms"].mean()
-                    if third > 0
-                    else 180
-                ),
-                df.iloc[2 * third :]["execution_time_ms"].mean() if third > 0 else 220,
-            ]
+    measured = history_df[["estimated_emissions_gco2", "execution_time_ms"]]
+    have = measured.notna().any()
+    if len(measured) >= 3 and have["estimated_emissions_gco2"]:
+        means = _third_means(measured.to_numpy(dtype=float))
+        emissions_avg = means[0]
+        if have["execution_time_ms"]:
+            latency_avg = means[1]
     fig = go.Figure(
         data=[
             go.Bar(
@@ -183,16 +227,35 @@ def create_strategy_comparison_chart(history_data):
     return fig
 
 
-def create_carbon_intensity_chart(carbon_df, deferred_queries=None):
+def _minmax_downsample(y, n_out):
+    """Indices keeping each bucket's min and max, so spikes survive"""
+    n_buckets = max(1, n_out // 2)
+    size = -(-len(y) // n_buckets)
+    padded = np.pad(y, (0, n_buckets * size - len(y)), mode="edge")
+    buckets = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate(
+        [offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1)]
+    )
+    return np.unique(np.clip(idx, 0, len(y) - 1))
+
+
+@st.cache_data(ttl=60)
+def create_carbon_intensity_chart(carbon_df, deferred_times=None):
     """Create time series chart for carbon intensity"""
     if carbon_df.empty:
         return None
     fig = go.Figure()
+    timestamps = carbon_df["timestamp"].to_numpy()
+    intensity = carbon_df["carbon_intensity"].to_numpy(dtype=np.float64)
+    if len(intensity) > MAX_CHART_POINTS:
+        keep = _minmax_downsample(intensity, MAX_CHART_POINTS)
+        timestamps, intensity = timestamps[keep], intensity[keep]
     # Main carbon intensity line (fixed column name to match JSON data)
     fig.add_trace(
-        go.Scatter(
-            x=carbon_df["timestamp"],
-            y=carbon_df["carbon_intensity"],
+        go.Scattergl(
+            x=timestamps,
+            y=intensity,
             mode="lines+markers",
             name="Carbon Intensity",
             line=dict(color="#2E7D32", width=2),
@@ -208,26 +271,23 @@ def create_carbon_intensity_chart(carbon_df, deferred_queries=None):
         annotation_text=f"Threshold ({threshold} gCO₂/kWh)",
     )
     # Deferred query markers
-    if deferred_queries:
-        deferred_times = [
-            pd.to_datetime(q.get("executed_at"))
-            for q in deferred_queries
-            if q.get("executed_at")
-        ]
-        if deferred_times:
-            deferred_intensities = []
-            for dt in deferred_times:
-                idx = (carbon_df["timestamp"] - dt).abs().idxmin()
-                deferred_intensities.append(carbon_df.loc[idx, "carbon_intensity"])
-            fig.add_trace(
-                go.Scatter(
-                    x=deferred_times,
-                    y=deferred_intensities,
-                    mode="markers",
-                    name="Deferred Query Executed",
-                    marker=dict(size=12, color="orange", symbol="star"),
-                )
+    if deferred_times is not None and len(deferred_times):
+        # Nearest history sample for every marker; history is sorted on load
+        ts = carbon_df["timestamp"].to_numpy()
+        marker_ts = pd.to_datetime(deferred_times, format="ISO8601", cache=True)
+        marker_ts = marker_ts.to_numpy().astype(ts.dtype)
+        right = np.minimum(np.searchsorted(ts, marker_ts), len(ts) - 1)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(ts[right] - marker_ts < marker_ts - ts[left], right, left)
+        fig.add_trace(
+            go.Scattergl(
+                x=marker_ts,
+                y=carbon_df["carbon_intensity"].to_numpy()[nearest],
+                mode="markers",
+                name="Deferred Query Executed",
+                marker=dict(size=12, color="orange", symbol="star"),
             )
+        )
     fig.update_layout(
         title="Historical Carbon Intensity with Deferred Executions",
         xaxis_title="Time",
@@ -240,6 +300,10 @@ def create_carbon_intensity_chart(carbon_df, deferred_queries=None):
 
 
 def main():
+    # Custom CSS for professional styling; the file read is cached, but the
+    # markdown element must be emitted on every rerun or Streamlit drops it
+    st.markdown(load_css(), unsafe_allow_html=True)
+
     # Header
     st.markdown(
         '<h1 class="main-header">⚡️ Carbon-Aware Query Engine</h1>',
@@ -250,8 +314,10 @@ def main():
         unsafe_allow_html=True,
     )
 
+    history_days = st.sidebar.slider("History window (days)", 1, 30, 7)
+    current_ci, summary, history_df, deferred = fetch_dashboard_data()
+
     # Current carbon intensity banner
-    current_ci = get_current_carbon_intensity()
     if current_ci:
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -269,7 +335,6 @@ def main():
         with col3:
             st.metric("Source", current_ci["source"])
         with col4:
-            summary = fetch_emissions_summary()
             if summary:
                 st.metric("Total Queries", summary["total_queries"])
     st.divider()
@@ -279,8 +344,7 @@ def main():
     viz_col1, viz_col2 = st.columns(2)
     with viz_col1:
         st.subheader("Strategy Comparison")
-        history = fetch_query_history()
-        chart = create_strategy_comparison_chart(history)
+        chart = create_strategy_comparison_chart(history_df)
         if chart:
             st.plotly_chart(chart, use_container_width=True)
         else:
@@ -289,10 +353,7 @@ def main():
             )
     with viz_col2:
         st.subheader("Carbon Intensity Timeline")
-        carbon_df = load_carbon_history()
-        deferred = (
-            [q for q in history if q.get("status") == "deferred"] if history else []
-        )
+        carbon_df = load_carbon_history(days=history_days)
         chart = create_carbon_intensity_chart(carbon_df, deferred)
         if chart:
             st.plotly_chart(chart, use_container_width=True)
@@ -333,23 +394,19 @@ def main():
             else:
                 with st.spinner("Executing query..."):
                     try:
-                        headers = {
-                            "X-API-Key": API_KEY,
-                            "Content-Type": "application/json",
-                        }
                         payload = {
                             "query": sql_query,
                             "urgency": urgency,
                             "explain": True,
                         }
-                        response = requests.post(
+                        response = get_session().post(
                             f"{API_URL}/query/execute",
-                            headers=headers,
-                            json=payload,
-                            timeout=45,
+                            data=orjson.dumps(payload),
+                            headers={"Content-Type": "application/json"},
+                            timeout=(3, 45),
                         )
                         if response.status_code == 200:
-                            result = response.json()
+                            result = orjson.loads(response.content)
                             if result.get("deferred"):
                                 st.warning(
                                     f"⏸️ Query Deferred for {result.get('defer_minutes', 'N/A')} minutes"
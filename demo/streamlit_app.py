@@ -286,7 +286,7 @@ with tab2:
                 comparison = engine.compare_strategies(compare_sql)
 
                 # Convert to DataFrame
-                df = pd.DataFrame(comparison).T
+                df = pd.DataFrame(list(comparison.values()), index=list(comparison))
                 df.index.name = "Strategy"
                 df = df.reset_index()
 
@@ -15,6 +15,8 @@ from src.optimizer.carbon_api import CarbonIntensity
 from src.core.compiler import MultiVariantCompiler, ExecutionStrategy
 from datetime import datetime
 
+_compiler = MultiVariantCompiler()
+
 
 def test_strategies():
     print("Testing Strategies...")
@@ -67,9 +69,7 @@ def test_selector_integration():
     # It does: variant = context.available_variants[strategy]
 
     # So we need to provide variants
-    compiler = MultiVariantCompiler()
-    variants = compiler.compile("SELECT * FROM t")
-    ctx.available_variants = variants
+    ctx.available_variants = _compiler.compile("SELECT * FROM t")
 
     decision = selector.select(ctx)
     print(
@@ -84,9 +84,8 @@ def test_selector_integration():
 
 def test_compiler_optimizations():
     print("\nTesting Compiler Optimizations...")
-    compiler = MultiVariantCompiler()
     sql = "SELECT * FROM users"
-    variants = compiler.compile(sql)
+    variants = _compiler.compile(sql)
 
     efficient_variant = variants[ExecutionStrategy.EFFICIENT]
     print(f"Efficient SQL: {efficient_variant.sql}")
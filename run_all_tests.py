@@ -10,36 +10,31 @@ def run_tests():
     print("RUNNING FULL TEST SUITE")
     print("=" * 80)
 
-    # Run pytest with verbose output
-    result = subprocess.run(
-        [sys.executable, "-m", "pytest", "tests/", "-v", "--tb=short"],
-        capture_output=True,
-        text=True,
-        cwd=".",
-    )
-
-    print("\nSTDOUT:")
-    print(result.stdout)
-
-    print("\nSTDERR:")
-    print(result.stderr)
-
-    print(f"\nReturn Code: {result.returncode}")
-    print("=" * 80)
-
-    # Write to file
+    # Run pytest with verbose output, teeing each line to the console and the
+    # results file as it arrives instead of buffering the whole run
     with open("test_results_full.txt", "w", encoding="utf-8") as f:
         f.write("=" * 80 + "\n")
         f.write("FULL TEST SUITE RESULTS\n")
         f.write("=" * 80 + "\n\n")
-        f.write("STDOUT:\n")
-        f.write(result.stdout)
-        f.write("\n\nSTDERR:\n")
-        f.write(result.stderr)
-        f.write(f"\n\nReturn Code: {result.returncode}\n")
-
+        f.write("OUTPUT:\n")
+        with subprocess.Popen(
+            [sys.executable, "-m", "pytest", "tests/", "-v", "--tb=short"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            cwd=".",
+        ) as proc:
+            for line in proc.stdout:
+                sys.stdout.write(line)
+                f.write(line)
+        returncode = proc.wait()
+        f.write(f"\n\nReturn Code: {returncode}\n")
+
+    print(f"\nReturn Code: {returncode}")
+    print("=" * 80)
     print("\nResults written to test_results_full.txt")
-    return result.returncode
+    return returncode
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 import subprocess
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 test_files = [
     "tests/test_version.py",
@@ -13,30 +14,42 @@ test_files = [
     "tests/test_query_parser.py",
 ]
 
-results = {}
-
-for test_file in test_files:
-    print(f"\n{'='*80}")
-    print(f"Running: {test_file}")
-    print("=" * 80)
 
+def run_test_file(test_file):
+    """Run one test file in its own pytest process and capture its output"""
     result = subprocess.run(
         [sys.executable, "-m", "pytest", test_file, "-v", "--tb=short"],
         capture_output=True,
         text=True,
         cwd=".",
     )
-
-    results[test_file] = {
+    return {
         "returncode": result.returncode,
         "stdout": result.stdout,
         "stderr": result.stderr,
     }
 
-    print(result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
-    print(f"Return code: {result.returncode}")
+
+results = {}
+
+# Each file already runs in its own pytest subprocess, so threads are enough
+# to overlap them
+with ThreadPoolExecutor(max_workers=min(len(test_files), os.cpu_count() or 1)) as ex:
+    futures = {ex.submit(run_test_file, t): t for t in test_files}
+    for future in as_completed(futures):
+        test_file = futures[future]
+        result = results[test_file] = future.result()
+
+        print(f"\n{'='*80}")
+        print(f"Finished: {test_file}")
+        print("=" * 80)
+        print(result["stdout"])
+        if result["stderr"]:
+            print("STDERR:", result["stderr"])
+        print(f"Return code: {result['returncode']}")
+
+# Report in the declared order, not completion order
+results = {t: results[t] for t in test_files}
 
 # Write summary
 print(f"\n{'='*80}")
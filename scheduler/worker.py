@@ -1,24 +1,72 @@
 """Background worker for scheduled query execution"""
 
+import math
 import os
+import select as io_select
+import signal
 import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from loguru import logger
-from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-
-from ..db.database import get_db_context, DatabaseManager
-from ..db.models import ScheduledQuery, QueryExecution, QueryStatusEnum
-from ..core.engine import CarbonAwareQueryEngine
-from ..optimizer.selector import QueryUrgency
+from sqlalchemy import delete, func, or_, select, update
+
+from ..db.database import engine as db_engine, get_db_context, DatabaseManager
+from ..db.models import SCHEDULED_QUERY_CHANNEL, CarbonIntensityData, ScheduledQuery
+from ..scheduler.app import celery_app
+from ..scheduler.tasks import MIN_RETRY_SECONDS, run_scheduled
+
+# Polling interval right after finding work where LISTEN/NOTIFY is unavailable
+# (e.g. SQLite); it doubles with every empty poll
+MIN_POLL_SECONDS = 1.0
+# Longest the worker ever sleeps; also a safety net for missed notifications
+FALLBACK_POLL_SECONDS = 300
+# Doublings after which the backoff reaches FALLBACK_POLL_SECONDS; counting
+# further only grows an exponent that min() throws away
+MAX_BACKOFF_DOUBLINGS = math.ceil(math.log2(FALLBACK_POLL_SECONDS / MIN_POLL_SECONDS))
+# Scheduled queries claimed per poll
+BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "50"))
+# A claim older than this belongs to a task that died before recording its outcome
+CLAIM_TIMEOUT = timedelta(minutes=30)
+# Rows removed per cleanup transaction, bounding lock time and WAL volume
+CLEANUP_CHUNK_SIZE = 10_000
+
+
+def _claimable(now: datetime):
+    """Filter for pending scheduled queries no live worker has claimed"""
+    return (
+        ScheduledQuery.is_executed == False,
+        ScheduledQuery.execution_attempts < ScheduledQuery.max_attempts,
+        or_(
+            ScheduledQuery.claimed_at.is_(None),
+            ScheduledQuery.claimed_at < now - CLAIM_TIMEOUT,
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def _carbon_provider():
+    """Carbon provider shared by every carbon data refresh"""
+    from ..optimizer.carbon_provider import CarbonProvider
+
+    return CarbonProvider()
+
+
+def _hour(ts: datetime) -> datetime:
+    """Start of the hour containing ts"""
+    return ts.replace(minute=0, second=0, microsecond=0)
 
 
 class QuerySchedulerWorker:
-    """Worker for executing scheduled queries"""
+    """Dispatches due scheduled queries to the Celery workers that run them"""
 
     def __init__(self):
-        self.engine = CarbonAwareQueryEngine()
-        self.scheduler = BlockingScheduler()
+        self.scheduler = BackgroundScheduler()
+        self.consecutive_empty_polls = 0
+        # Set by SIGTERM; the claimed batch in progress is still finished
+        self.terminating = False
+        self.busy = False
         self.setup_logging()
 
     def setup_logging(self):
@@ -33,98 +81,147 @@ class QuerySchedulerWorker:
             level="INFO",
         )
 
-    def process_scheduled_queries(self):
-        """Process queries scheduled for execution"""
+    def process_scheduled_queries(self) -> int:
+        """Process queries scheduled for execution; returns how many were enqueued"""
         logger.info("Checking for scheduled queries...")
 
-        with get_db_context() as db:
-            # Get queries scheduled for now or earlier
-            now = datetime.utcnow()
-
-            scheduled = (
-                db.query(ScheduledQuery)
-                .filter(
-                    ScheduledQuery.scheduled_for <= now,
-                    ScheduledQuery.is_executed == False,
-                    ScheduledQuery.execution_attempts < ScheduledQuery.max_attempts,
+        # One timestamp for the whole drain; queries falling due meanwhile are
+        # picked up by the next poll
+        now = datetime.utcnow()
+        total = 0
+        self.busy = True
+        try:
+            # A full batch means more are probably due; keep draining rather
+            # than waiting for the next poll
+            while not self.terminating:
+                with get_db_context() as db:
+                    found = self.process_batch(db, now)
+                total += found
+                if found < BATCH_SIZE:
+                    break
+        finally:
+            self.busy = False
+        return total
+
+    def process_batch(self, db, now: datetime) -> int:
+        """Claim and enqueue one batch of due queries; returns how many were enqueued"""
+        # Claim a batch, skipping rows other schedulers hold
+        scheduled_ids = db.scalars(
+            select(ScheduledQuery.id)
+            .where(ScheduledQuery.scheduled_for <= now, *_claimable(now))
+            .order_by(ScheduledQuery.scheduled_for)
+            .limit(BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if scheduled_ids:
+            db.execute(
+                update(ScheduledQuery)
+                .where(ScheduledQuery.id.in_(scheduled_ids))
+                .values(claimed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        # Release the row locks now that the claim is recorded
+        db.commit()
+
+        logger.info(f"Found {len(scheduled_ids)} queries to execute")
+
+        # Celery workers run the queries and record the outcome, so a slow
+        # query never holds up polling
+        enqueued = set()
+        unqueued_ids = []
+        if scheduled_ids:
+            try:
+                # One broker producer for the whole batch, rather than one
+                # taken from the pool per task
+                with celery_app.producer_or_acquire() as producer:
+                    for scheduled_id in scheduled_ids:
+                        try:
+                            run_scheduled.apply_async(
+                                (scheduled_id,), producer=producer
+                            )
+                            enqueued.add(scheduled_id)
+                        except Exception as e:
+                            logger.error(
+                                f"Failed to enqueue scheduled query {scheduled_id}: {e}"
+                            )
+            except Exception as e:
+                logger.error(f"Failed to reach the task queue: {e}")
+            unqueued_ids = [i for i in scheduled_ids if i not in enqueued]
+
+        # Hand back what never reached the queue, due again only after a
+        # delay so a broker outage is not retried in a tight loop
+        if unqueued_ids:
+            db.execute(
+                update(ScheduledQuery)
+                .where(ScheduledQuery.id.in_(unqueued_ids))
+                .values(
+                    claimed_at=None,
+                    scheduled_for=now + timedelta(seconds=MIN_RETRY_SECONDS),
                 )
-                .all()
+                .execution_options(synchronize_session=False)
             )
+            db.commit()
+        return len(enqueued)
 
-            logger.info(f"Found {len(scheduled)} queries to execute")
-
-            for scheduled_query in scheduled:
-                try:
-                    self.execute_scheduled_query(db, scheduled_query)
-                except Exception as e:
-                    logger.error(
-                        f"Failed to execute scheduled query {scheduled_query.id}: {e}"
-                    )
-                    scheduled_query.execution_attempts += 1
-                    db.commit()
-
-    def execute_scheduled_query(self, db, scheduled_query: ScheduledQuery):
-        """Execute a single scheduled query"""
-        query_exec = (
-            db.query(QueryExecution)
-            .filter(QueryExecution.id == scheduled_query.query_execution_id)
-            .first()
+    def next_poll_interval(self, found: int) -> float:
+        """Poll quickly while work keeps arriving, back off while idle"""
+        self.consecutive_empty_polls = (
+            0 if found else min(self.consecutive_empty_polls + 1, MAX_BACKOFF_DOUBLINGS)
+        )
+        return min(
+            FALLBACK_POLL_SECONDS, MIN_POLL_SECONDS * 2**self.consecutive_empty_polls
         )
 
-        if not query_exec:
-            logger.error(
-                f"Query execution {scheduled_query.query_execution_id} not found"
+    def seconds_until_next_due(self) -> float:
+        """Seconds until the earliest pending scheduled query becomes due"""
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            next_due = (
+                db.query(func.min(ScheduledQuery.scheduled_for))
+                .filter(*_claimable(now))
+                .scalar()
             )
+        if next_due is None:
+            return FALLBACK_POLL_SECONDS
+        return max(0.0, (next_due - now).total_seconds())
+
+    def dispatch_scheduled_queries(self):
+        """Run due queries as they come up, waking on NOTIFY on Postgres"""
+        if db_engine.dialect.name != "postgresql":
+            while not self.terminating:
+                started = time.monotonic()
+                interval = min(
+                    self.next_poll_interval(self.process_scheduled_queries()),
+                    self.seconds_until_next_due(),
+                )
+                # Count the time spent processing against the wait
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
             return
 
-        logger.info(
-            f"Executing scheduled query {query_exec.id}: {query_exec.query_text[:50]}..."
-        )
-
+        raw = db_engine.raw_connection()
         try:
-            # Update status to running
-            query_exec.status = QueryStatusEnum.RUNNING
-            db.commit()
-
-            # Map urgency
-            urgency_map = {
-                "LOW": QueryUrgency.LOW,
-                "MEDIUM": QueryUrgency.MEDIUM,
-                "HIGH": QueryUrgency.HIGH,
-                "CRITICAL": QueryUrgency.CRITICAL,
-            }
-            urgency = urgency_map.get(query_exec.urgency.name, QueryUrgency.MEDIUM)
-
-            # Execute query
-            result, metrics, decision = self.engine.execute_query(
-                query=query_exec.query_text, urgency=urgency, explain=True
-            )
-
-            # Update query execution record
-            DatabaseManager.update_query_metrics(
-                db=db,
-                query_id=query_exec.id,
-                execution_time=metrics.get("execution_time_ms", 0),
-                energy=metrics.get("energy_joules", 0),
-                carbon_intensity=decision.carbon_intensity,
-                emissions=metrics.get("estimated_emissions_gco2", 0),
-                plan=decision.selected_plan,
-                decision_reason=decision.reason,
-            )
-
-            # Mark scheduled query as executed
-            scheduled_query.is_executed = True
-            scheduled_query.execution_attempts += 1
-            db.commit()
-
-            logger.info(f"Successfully executed query {query_exec.id}")
-
-        except Exception as e:
-            logger.error(f"Error executing query {query_exec.id}: {e}")
-            query_exec.status = QueryStatusEnum.FAILED
-            scheduled_query.execution_attempts += 1
-            db.commit()
-            raise
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {SCHEDULED_QUERY_CHANNEL}")
+
+            while not self.terminating:
+                self.process_scheduled_queries()
+                # Sleep until the next query is due, or a new one is scheduled
+                timeout = min(FALLBACK_POLL_SECONDS, self.seconds_until_next_due())
+                if io_select.select([conn], [], [], timeout)[0]:
+                    conn.poll()
+                    conn.notifies.clear()
+        finally:
+            raw.close()
+
+    def request_stop(self, signum, frame):
+        """SIGTERM handler: finish the claimed batch, then stop"""
+        logger.info("Stop requested, finishing the current batch...")
+        self.terminating = True
+        if not self.busy:
+            # Idle wait; nothing claimed, so leave right away
+            raise SystemExit(0)
 
     def cleanup_old_queries(self):
         """Clean up old executed scheduled queries"""
@@ -134,16 +231,27 @@ class QuerySchedulerWorker:
             # Delete queries executed more than 7 days ago
             cutoff = datetime.utcnow() - timedelta(days=7)
 
-            deleted = (
-                db.query(ScheduledQuery)
-                .filter(
+            chunk = (
+                select(ScheduledQuery.id)
+                .where(
                     ScheduledQuery.is_executed == True,
                     ScheduledQuery.updated_at < cutoff,
                 )
-                .delete()
+                .limit(CLEANUP_CHUNK_SIZE)
             )
 
-            db.commit()
+            deleted = 0
+            while True:
+                result = db.execute(
+                    delete(ScheduledQuery)
+                    .where(ScheduledQuery.id.in_(chunk))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                deleted += result.rowcount
+                if result.rowcount < CLEANUP_CHUNK_SIZE:
+                    break
+
             logger.info(f"Deleted {deleted} old scheduled queries")
 
     def update_carbon_data(self):
@@ -151,16 +259,33 @@ class QuerySchedulerWorker:
         logger.info("Updating carbon intensity data...")
 
         try:
-            from ..optimizer.carbon_provider import CarbonProvider
+            provider = _carbon_provider()
+            intensity = provider.get_current_intensity()
+            now = datetime.utcnow()
 
             with get_db_context() as db:
-                provider = CarbonProvider()
-                intensity = provider.get_current_intensity()
+                latest = (
+                    db.query(
+                        CarbonIntensityData.timestamp,
+                        CarbonIntensityData.carbon_intensity_gco2_kwh,
+                    )
+                    .filter(CarbonIntensityData.zone == provider.zone)
+                    .order_by(CarbonIntensityData.timestamp.desc())
+                    .first()
+                )
+                # The same reading again within the hour adds nothing
+                if (
+                    latest
+                    and latest.carbon_intensity_gco2_kwh == intensity
+                    and _hour(latest.timestamp) == _hour(now)
+                ):
+                    logger.debug(f"Carbon intensity unchanged at {intensity} gCO2/kWh")
+                    return
 
                 DatabaseManager.store_carbon_data(
                     db=db,
                     zone=provider.zone,
-                    timestamp=datetime.utcnow(),
+                    timestamp=now,
                     carbon_intensity=intensity,
                     source="electricitymaps" if provider.has_api_access else "fallback",
                 )
@@ -174,16 +299,7 @@ class QuerySchedulerWorker:
         """Start the scheduler worker"""
         logger.info("Starting Query Scheduler Worker...")
 
-        # Schedule tasks
-        # Check for scheduled queries every minute
-        self.scheduler.add_job(
-            self.process_scheduled_queries,
-            trigger=IntervalTrigger(minutes=1),
-            id="process_scheduled_queries",
-            name="Process scheduled queries",
-            replace_existing=True,
-        )
-
+        # Schedule periodic tasks; scheduled queries are dispatched below
         # Update carbon data every 15 minutes
         self.scheduler.add_job(
             self.update_carbon_data,
@@ -205,13 +321,17 @@ class QuerySchedulerWorker:
         # Run initial carbon data update
         self.update_carbon_data()
 
+        self.scheduler.start()
         logger.info("Scheduler started successfully")
 
-        # Start scheduler (blocking)
+        # Dispatch scheduled queries on this thread (blocking)
+        signal.signal(signal.SIGTERM, self.request_stop)
         try:
-            self.scheduler.start()
+            self.dispatch_scheduled_queries()
         except (KeyboardInterrupt, SystemExit):
             logger.info("Scheduler stopped")
+        finally:
+            self.scheduler.shutdown(wait=False)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
 # FastAPI application for Energy ML API
 
 import os
+import time
+import logging
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import APIKeyHeader
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -13,7 +20,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-from src.db.database import get_db, init_db
+from src.db.database import get_db, init_db, warm_pool
 from src.db.models import (
     QueryExecution,
     QueryUrgencyEnum,
@@ -23,14 +30,45 @@ from src.db.models import (
 from src.core.engine import CarbonAwareQueryEngine
 from src.optimizer.selector import QueryUrgency
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+logger = logging.getLogger(__name__)
+
+# Map urgency strings from requests to selector urgencies
+URGENCY_MAP = {
+    "low": QueryUrgency.LOW,
+    "medium": QueryUrgency.MEDIUM,
+    "high": QueryUrgency.HIGH,
+    "critical": QueryUrgency.CRITICAL,
+}
+
+# Initialize rate limiter; counters live in Redis so every worker process
+# shares them, falling back to per-process memory without REDIS_URL or
+# while Redis is unreachable
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=os.getenv("REDIS_URL", "memory://"),
+    in_memory_fallback_enabled=True,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the query engine and DB connections once per worker process"""
+    app.state.engine = CarbonAwareQueryEngine()
+    try:
+        warm_pool()
+    except Exception as e:
+        # Not fatal; requests connect on demand and /health reports the outage
+        logger.warning(f"Could not pre-warm the database pool: {e}")
+    yield
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Carbon-Aware Query Engine API",
     description="API for executing SQL queries with carbon awareness",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add rate limiter to app state
@@ -68,6 +106,21 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
     return api_key
 
 
+def get_engine(request: Request) -> CarbonAwareQueryEngine:
+    """Dependency returning the shared query engine"""
+    return request.app.state.engine
+
+
+# The shared engine's DuckDB connections must not be used by two threads at once
+_engine_lock = threading.Lock()
+
+
+def _execute_serialized(engine: CarbonAwareQueryEngine, **kwargs):
+    """Run one engine call at a time; meant to be called off the event loop"""
+    with _engine_lock:
+        return engine.execute_query(**kwargs)
+
+
 # Pydantic models
 class QueryRequest(BaseModel):
     query: str = Field(..., description="SQL query to execute")
@@ -121,6 +174,14 @@ class EmissionsSummaryResponse(BaseModel):
     avg_emissions_gco2: float
     avg_execution_time_ms: float
     avg_carbon_intensity: float
+    # Only computed on Postgres
+    median_execution_time_ms: Optional[float] = None
+
+
+class DashboardSnapshotResponse(BaseModel):
+    carbon: Optional[dict] = None
+    emissions: EmissionsSummaryResponse
+    history: List[QueryHistoryResponse]
 
 
 class HealthResponse(BaseModel):
@@ -130,6 +191,38 @@ class HealthResponse(BaseModel):
     database: str
 
 
+# Enum values by member, read once per row while serializing history
+_URGENCY_VAL = {m: m.value for m in QueryUrgencyEnum}
+_STATUS_VAL = {m: m.value for m in QueryStatusEnum}
+
+# The QueryExecution columns a history row needs
+HISTORY_COLUMNS = (
+    QueryExecution.id,
+    QueryExecution.query_text,
+    QueryExecution.urgency,
+    QueryExecution.status,
+    QueryExecution.execution_time_ms,
+    QueryExecution.estimated_emissions_gco2,
+    QueryExecution.created_at,
+    QueryExecution.executed_at,
+)
+
+
+def _history_response(query) -> QueryHistoryResponse:
+    """Serialize a QueryExecution, or a row of HISTORY_COLUMNS, for history"""
+    # Values come straight from the database; skip re-validating them
+    return QueryHistoryResponse.model_construct(
+        id=query.id,
+        query_text=query.query_text,
+        urgency=_URGENCY_VAL[query.urgency],
+        status=_STATUS_VAL[query.status],
+        execution_time_ms=query.execution_time_ms,
+        estimated_emissions_gco2=query.estimated_emissions_gco2,
+        created_at=query.created_at,
+        executed_at=query.executed_at,
+    )
+
+
 # Endpoints
 @app.get("/", response_model=dict)
 async def root():
@@ -171,6 +264,7 @@ async def execute_query(
     request: QueryRequest,
     db: Session = Depends(get_db),
     api_key: str = Depends(verify_api_key),
+    engine: CarbonAwareQueryEngine = Depends(get_engine),
 ):
     """Execute a SQL query with carbon awareness"""
     try:
@@ -183,23 +277,19 @@ async def execute_query(
             urgency=request.urgency,
             user_id=request.user_id,
         )
-        # Initialize engine
-        engine = CarbonAwareQueryEngine()
-        # Map urgency string to enum
-        urgency_map = {
-            "low": QueryUrgency.LOW,
-            "medium": QueryUrgency.MEDIUM,
-            "high": QueryUrgency.HIGH,
-            "critical": QueryUrgency.CRITICAL,
-        }
-        # Execute query
-        result, metrics, decision = engine.execute_query(
+        # Execute query in a worker thread so the event loop keeps serving
+        # other requests; the DB session stays on this coroutine
+        result, metrics, decision = await asyncio.to_thread(
+            _execute_serialized,
+            engine,
             query=request.query,
-            urgency=urgency_map.get(request.urgency.lower(), QueryUrgency.MEDIUM),
+            urgency=URGENCY_MAP.get(request.urgency.lower(), QueryUrgency.MEDIUM),
             explain=request.explain,
         )
-        # Update metrics in DB
-        DatabaseManager.update_query_metrics(
+        # One timestamp for everything recorded about this execution
+        now = datetime.utcnow()
+        # Update metrics in DB, reading back the uncertainty values
+        uncertainty = DatabaseManager.update_query_metrics(
             db=db,
             query_id=query_exec.id,
             execution_time=metrics.get("execution_time_ms", 0),
@@ -208,21 +298,14 @@ async def execute_query(
             emissions=metrics.get("estimated_emissions_gco2", 0),
             plan=decision.selected_plan,
             decision_reason=decision.reason,
+            executed_at=now,
         )
-        # Retrieve uncertainty values from DB
-        qe = db.query(QueryExecution).filter(QueryExecution.id == query_exec.id).first()
-        qm = (
-            db.query(QueryMetrics)
-            .filter(QueryMetrics.query_id == query_exec.id)
-            .first()
-        )
-        forecast_uncertainty = getattr(qe, "forecast_uncertainty_gco2_kwh", None)
-        energy_std_dev = getattr(qm, "energy_std_dev_joules", None)
+        forecast_uncertainty, energy_std_dev = uncertainty or (None, None)
         # Check deferral
         deferred = decision.action == "defer"
         scheduled_at = None
         if deferred:
-            scheduled_at = datetime.utcnow() + timedelta(minutes=decision.defer_minutes)
+            scheduled_at = now + timedelta(minutes=decision.defer_minutes)
         return QueryResponse(
             query_id=query_exec.id,
             status="deferred" if deferred else "completed",
@@ -245,32 +328,28 @@ async def execute_query(
         )
 
 
-@app.get("/query/history", response_model=List[QueryHistoryResponse])
+# Most rows have not executed yet; leaving their null fields out keeps pages small
+@app.get(
+    "/query/history",
+    response_model=List[QueryHistoryResponse],
+    response_model_exclude_none=True,
+)
 @limiter.limit("30/minute")
 async def get_query_history(
     request: Request,
     limit: int = 100,
     user_id: Optional[int] = None,
+    cursor: Optional[int] = None,
     db: Session = Depends(get_db),
     api_key: str = Depends(verify_api_key),
 ):
-    """Get query execution history"""
+    """Get query execution history; pass the last id seen as `cursor` to page"""
     from src.db.database import DatabaseManager
 
-    queries = DatabaseManager.get_query_history(db=db, user_id=user_id, limit=limit)
-    return [
-        QueryHistoryResponse(
-            id=q.id,
-            query_text=q.query_text,
-            urgency=q.urgency.value,
-            status=q.status.value,
-            execution_time_ms=q.execution_time_ms,
-            estimated_emissions_gco2=q.estimated_emissions_gco2,
-            created_at=q.created_at,
-            executed_at=q.executed_at,
-        )
-        for q in queries
-    ]
+    queries = DatabaseManager.get_query_history(
+        db=db, user_id=user_id, limit=limit, cursor=cursor, columns=HISTORY_COLUMNS
+    )
+    return [_history_response(q) for q in queries]
 
 
 @app.get("/query/{query_id}", response_model=QueryHistoryResponse)
@@ -282,16 +361,7 @@ async def get_query_details(query_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Query with ID {query_id} not found",
         )
-    return QueryHistoryResponse(
-        id=query.id,
-        query_text=query.query_text,
-        urgency=query.urgency.value,
-        status=query.status.value,
-        execution_time_ms=query.execution_time_ms,
-        estimated_emissions_gco2=query.estimated_emissions_gco2,
-        created_at=query.created_at,
-        executed_at=query.executed_at,
-    )
+    return _history_response(query)
 
 
 @app.get("/metrics/uncertainty/{query_id}")
@@ -326,15 +396,31 @@ async def get_emissions_summary(
     return EmissionsSummaryResponse(**summary)
 
 
+# Grid intensity moves on an hourly scale; answer repeat lookups from memory
+CARBON_CACHE_TTL_SECONDS = 300
+CARBON_CACHE_MAX_ZONES = 256
+_carbon_cache = {}  # zone -> (expires_at, response)
+
+
+@lru_cache(maxsize=32)
+def _carbon_provider(zone: Optional[str]):
+    """One provider per zone, reused across requests"""
+    from src.optimizer.carbon_api import CarbonProvider
+
+    return CarbonProvider(zone=zone)
+
+
 @app.get("/carbon/current")
 async def get_current_carbon_intensity(zone: str = None):
     """Get current carbon intensity for a zone"""
-    from src.optimizer.carbon_api import CarbonProvider
+    cached = _carbon_cache.get(zone)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
 
     try:
-        provider = CarbonProvider(zone=zone)
+        provider = _carbon_provider(zone)
         intensity = provider.get_current_intensity()
-        return {
+        response = {
             "zone": provider.zone,
             "carbon_intensity_gco2_kwh": intensity,
             "timestamp": datetime.utcnow(),
@@ -346,6 +432,39 @@ async def get_current_carbon_intensity(zone: str = None):
             detail=f"Failed to get carbon intensity: {str(e)}",
         )
 
+    # Zones come from the client, so keep the cache bounded
+    if len(_carbon_cache) >= CARBON_CACHE_MAX_ZONES:
+        _carbon_cache.clear()
+    _carbon_cache[zone] = (time.monotonic() + CARBON_CACHE_TTL_SECONDS, response)
+    return response
+
+
+@app.get("/dashboard/snapshot", response_model=DashboardSnapshotResponse)
+@limiter.limit("30/minute")
+async def get_dashboard_snapshot(
+    request: Request,
+    limit: int = 100,
+    days: int = 30,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key),
+):
+    """Current intensity, emissions summary and history in a single response"""
+    from src.db.database import DatabaseManager
+
+    try:
+        carbon = await get_current_carbon_intensity()
+    except HTTPException:
+        carbon = None
+    summary = DatabaseManager.get_emissions_summary(db=db, days=days)
+    queries = DatabaseManager.get_query_history(
+        db=db, limit=limit, columns=HISTORY_COLUMNS
+    )
+    return DashboardSnapshotResponse(
+        carbon=carbon,
+        emissions=EmissionsSummaryResponse(**summary),
+        history=[_history_response(q) for q in queries],
+    )
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,10 +1,37 @@
 ﻿# src/core/compiler.py
 import duckdb
 from enum import Enum
+from functools import lru_cache
 from typing import Dict, Optional
 from dataclasses import dataclass
 import os
 
+from src.utils.query_parser import QueryAnalyzer
+
+# Distinct SQL strings whose compiled variants each compiler keeps
+VARIANT_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=None)
+def _supported_settings(version: str) -> frozenset:
+    """Settings get_connection applies that this DuckDB version accepts"""
+    probes = {
+        "threads": "SET threads TO 1",
+        "memory_limit": "SET memory_limit = '1GB'",
+    }
+    supported = set()
+    conn = duckdb.connect(":memory:")
+    try:
+        for setting, probe in probes.items():
+            try:
+                conn.execute(probe)
+                supported.add(setting)
+            except duckdb.Error:
+                pass
+    finally:
+        conn.close()
+    return frozenset(supported)
+
 
 class ExecutionStrategy(Enum):
     """Execution strategies for queries"""
@@ -14,55 +41,100 @@ class ExecutionStrategy(Enum):
     BALANCED = "balanced"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
+class VariantConfig:
+    """DuckDB settings a variant runs with"""
+
+    threads: int
+    memory_limit: str
+    enable_optimizer: bool = True
+
+
+@dataclass(slots=True)
 class QueryVariant:
     """A compiled query variant with specific configuration"""
 
     strategy: ExecutionStrategy
-    config: Dict
+    config: VariantConfig
     sql: Optional[str] = None
     estimated_energy: Optional[float] = None
     estimated_latency: Optional[float] = None
 
     def __str__(self):
-        return f"{self.strategy.value}: threads={self.config.get('threads', 'N/A')}"
+        return f"{self.strategy.value}: threads={self.config.threads}"
 
 
 class MultiVariantCompiler:
     """Compiles queries into multiple execution variants"""
 
-    def __init__(self, db_path: str = ":memory:"):
+    def __init__(
+        self, db_path: str = ":memory:", conn: duckdb.DuckDBPyConnection = None
+    ):
         self.db_path = db_path
-        self.conn_pool = {}
+        # One connection for every variant; DuckDB runs in-process, so more
+        # connections only add catalog and buffer memory. A connection passed
+        # in stays open for its owner to close.
+        self.conn = conn
+        self._owns_conn = conn is None
+        self._applied_config = None
         self.max_threads = os.cpu_count() or 4
+        # Settings only depend on the machine, so every query shares them
+        self.configs = {
+            ExecutionStrategy.FAST: VariantConfig(
+                threads=self.max_threads, memory_limit="4GB"
+            ),
+            ExecutionStrategy.EFFICIENT: VariantConfig(
+                threads=max(1, self.max_threads // 4), memory_limit="1GB"
+            ),
+            ExecutionStrategy.BALANCED: VariantConfig(
+                threads=max(2, self.max_threads // 2), memory_limit="2GB"
+            ),
+        }
+        self.analyzer = QueryAnalyzer()
+        self._compile_cached = lru_cache(maxsize=VARIANT_CACHE_SIZE)(self._compile)
 
     def compile(self, sql: str) -> Dict[ExecutionStrategy, QueryVariant]:
-        """Compile query into multiple variants"""
+        """
+        Compile query into multiple variants
+
+        Variants are cached per SQL string and shared between calls; their
+        configs are frozen.
+        """
+        return dict(self._compile_cached(sql))
+
+    def _compile(self, sql: str) -> Dict[ExecutionStrategy, QueryVariant]:
+        """Build the variants for a query"""
+        # Without a table to scan, thread and memory settings change nothing,
+        # so every strategy runs the query as BALANCED would
+        if self._is_trivial(sql):
+            return {
+                strategy: QueryVariant(
+                    strategy=strategy,
+                    config=self.configs[ExecutionStrategy.BALANCED],
+                    estimated_latency=140.0,
+                    estimated_energy=110.0,
+                    sql=sql,
+                )
+                for strategy in ExecutionStrategy
+            }
+
         variants = {}
 
         # FAST variant: Maximum performance
         variants[ExecutionStrategy.FAST] = QueryVariant(
             strategy=ExecutionStrategy.FAST,
-            config={
-                "threads": self.max_threads,
-                "memory_limit": "4GB",
-                "enable_optimizer": True,
-            },
+            config=self.configs[ExecutionStrategy.FAST],
             estimated_latency=100.0,
             estimated_energy=150.0,
             sql=sql,
         )
 
         # EFFICIENT variant: Minimize energy
-        efficient_threads = max(1, self.max_threads // 4)
+        efficient_config = self.configs[ExecutionStrategy.EFFICIENT]
         variants[ExecutionStrategy.EFFICIENT] = QueryVariant(
             strategy=ExecutionStrategy.EFFICIENT,
-            config={
-                "threads": efficient_threads,
-                "memory_limit": "1GB",
-                "enable_optimizer": True,
-            },
-            sql=self._optimize_efficient_sql(sql, efficient_threads),
+            config=efficient_config,
+            sql=self._optimize_efficient_sql(sql, efficient_config.threads),
             estimated_latency=200.0,
             estimated_energy=80.0,
         )
@@ -70,11 +142,7 @@ class MultiVariantCompiler:
         # BALANCED variant: Trade-off
         variants[ExecutionStrategy.BALANCED] = QueryVariant(
             strategy=ExecutionStrategy.BALANCED,
-            config={
-                "threads": max(2, self.max_threads // 2),
-                "memory_limit": "2GB",
-                "enable_optimizer": True,
-            },
+            config=self.configs[ExecutionStrategy.BALANCED],
             estimated_latency=140.0,
             estimated_energy=110.0,
             sql=sql,
@@ -82,6 +150,17 @@ class MultiVariantCompiler:
 
         return variants
 
+    def _is_trivial(self, sql: str) -> bool:
+        """Whether a query reads no tables and does no joins, grouping or sorting"""
+        a = self.analyzer.analyze(sql)
+        return not (
+            a["tables"]
+            or a["has_join"]
+            or a["has_aggregation"]
+            or a["has_sort"]
+            or a["has_subquery"]
+        )
+
     def _optimize_efficient_sql(self, sql: str, threads: int) -> str:
         """Optimize SQL for efficient execution"""
         # Check for SELECT *
@@ -97,28 +176,31 @@ class MultiVariantCompiler:
         return f"PRAGMA threads={threads};\n{sql}"
 
     def get_connection(self, variant: QueryVariant) -> duckdb.DuckDBPyConnection:
-        """Get or create a configured connection for a variant"""
-        strategy_key = variant.strategy.value
-
-        if strategy_key not in self.conn_pool:
-            conn = duckdb.connect(self.db_path)
-
-            try:
-                conn.execute(f"SET threads TO {variant.config['threads']}")
-            except:
-                pass
-
-            try:
-                conn.execute(f"SET memory_limit = '{variant.config['memory_limit']}'")
-            except:
-                pass
-
-            self.conn_pool[strategy_key] = conn
-
-        return self.conn_pool[strategy_key]
+        """Get the shared connection, configured for a variant"""
+        if self.conn is None:
+            self.conn = duckdb.connect(self.db_path)
+
+        # Apply the variant's settings only when they change
+        if variant.config is not self._applied_config:
+            config = variant.config
+            supported = _supported_settings(duckdb.__version__)
+            statements = []
+            if "threads" in supported:
+                statements.append(f"SET threads TO {config.threads}")
+            if "memory_limit" in supported:
+                statements.append(f"SET memory_limit = '{config.memory_limit}'")
+            # All settings in one round trip
+            if statements:
+                self.conn.execute("; ".join(statements))
+
+            self._applied_config = variant.config
+
+        return self.conn
 
     def close_all(self):
-        """Close all pooled connections"""
-        for conn in self.conn_pool.values():
-            conn.close()
-        self.conn_pool.clear()
+        """Close the shared connection"""
+        if self.conn is not None:
+            if self._owns_conn:
+                self.conn.close()
+                self.conn = None
+            self._applied_config = None
@@ -42,13 +42,15 @@ except ImportError:
 
 
 # src/core/engine.py
-from typing import Any, Tuple, Optional
+from typing import Any, Dict, NamedTuple, Tuple, Optional
 import logging
-from datetime import datetime
 
-from src.core.compiler import MultiVariantCompiler, ExecutionStrategy
-from src.core.profiler import EnergyProfiler, EnergyMetrics
-from src.optimizer.carbon_api import CarbonAPI
+import duckdb
+
+from src.core.compiler import MultiVariantCompiler, ExecutionStrategy, QueryVariant
+from src.core.executor import fetch_result
+from src.core.profiler import EnergyProfiler, EnergyMetrics, shared_profiler
+from src.optimizer.carbon_api import CarbonAPI, CarbonIntensity
 from src.optimizer.selector import (
     CarbonAwareSelector,
     QueryUrgency,
@@ -59,6 +61,19 @@ from src.monitoring.metrics import MetricsCollector
 
 logger = logging.getLogger(__name__)
 
+# Distinct SQL strings each engine keeps prepared on its connection
+PREPARED_CACHE_SIZE = 256
+
+
+class StrategyResult(NamedTuple):
+    """One strategy's measurements from compare_strategies"""
+
+    energy_joules: float
+    duration_ms: float
+    power_watts: float
+    carbon_grams: float
+    result_count: int
+
 
 class CarbonAwareQueryEngine:
     """
@@ -69,30 +84,41 @@ class CarbonAwareQueryEngine:
         result, metrics, decision = engine.execute(sql, urgency=QueryUrgency.MEDIUM)
     """
 
-    def __init__(self, db_path: str = ":memory:", enable_logging: bool = True):
+    def __init__(
+        self,
+        db_path: str = ":memory:",
+        enable_logging: bool = True,
+        conn: duckdb.DuckDBPyConnection = None,
+    ):
         """
         Initialize the carbon-aware query engine
 
         Args:
             db_path: Path to DuckDB database file
             enable_logging: Whether to enable detailed logging
+            conn: Open DuckDB connection to run queries on instead of
+                opening db_path; the caller keeps ownership of it
         """
         self.db_path = db_path
 
         # Initialize components
-        self.compiler = MultiVariantCompiler(db_path)
-        self.profiler = EnergyProfiler()
+        self.compiler = MultiVariantCompiler(db_path, conn)
+        self.profiler = shared_profiler()
         self.carbon_api = CarbonAPI()
         self.selector = CarbonAwareSelector(self.carbon_api)
         self.metrics_collector = MetricsCollector()
+        # Statement name per SQL string, on the connection they were prepared on
+        self._prepared: Dict[str, str] = {}
+        self._prepared_conn = None
 
-        if enable_logging:
+        # Only configure logging if the application hasn't already
+        if enable_logging and not logging.root.handlers:
             logging.basicConfig(
                 level=logging.INFO,
                 format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
             )
 
-        logger.info(f"CarbonAwareQueryEngine initialized with db_path={db_path}")
+        logger.info("CarbonAwareQueryEngine initialized with db_path=%s", db_path)
 
     def execute(
         self,
@@ -111,15 +137,15 @@ class CarbonAwareQueryEngine:
         Returns:
             Tuple of (query_result, energy_metrics, selection_decision)
         """
-        logger.info(f"Executing query with urgency={urgency.value}")
+        logger.info("Executing query with urgency=%s", urgency.value)
 
         # Step 1: Get current carbon intensity
         carbon = self.carbon_api.get_current_intensity()
-        logger.info(f"Carbon intensity: {carbon.value:.0f} gCO2/kWh")
+        logger.info("Carbon intensity: %.0f gCO2/kWh", carbon.value)
 
         # Step 2: Compile query into variants
         variants = self.compiler.compile(sql)
-        logger.info(f"Generated {len(variants)} execution variants")
+        logger.info("Generated %d execution variants", len(variants))
 
         # Step 3: Select optimal variant
         context = SelectionContext(
@@ -131,30 +157,60 @@ class CarbonAwareQueryEngine:
         decision = self.selector.select(context)
 
         if explain:
-            print("\n" + "=" * 60)
-            print("CARBON-AWARE EXECUTION DECISION")
-            print("=" * 60)
-            print(decision.explain())
-            print("=" * 60 + "\n")
+            rule = "=" * 60
+            print(
+                f"\n{rule}\nCARBON-AWARE EXECUTION DECISION\n{rule}\n"
+                f"{decision.explain()}\n{rule}\n"
+            )
 
         # Step 4: Handle deferred execution
         if decision.should_defer:
-            logger.info(f"Query deferred for {decision.defer_minutes} minutes")
+            logger.info("Query deferred for %s minutes", decision.defer_minutes)
             return None, None, decision
 
         # Step 5: Execute with selected variant
-        logger.info(f"Executing with {decision.selected_strategy.value} variant")
+        logger.info("Executing with %s variant", decision.selected_strategy.value)
+        result, metrics = self._run(sql, decision.selected_variant)
+
+        # Step 6: Record metrics
+        self._record(sql, urgency, decision, metrics, carbon)
 
-        conn = self.compiler.get_connection(decision.selected_variant)
+        logger.info(
+            "Query completed: %.2fms, %.2fJ", metrics.duration_ms, metrics.energy_joules
+        )
+
+        if explain:
+            # One write per block rather than one per line
+            print(
+                f"ACTUAL PERFORMANCE:\n"
+                f"  Energy: {metrics.energy_joules:.2f} J\n"
+                f"  Duration: {metrics.duration_ms:.2f} ms\n"
+                f"  Power: {metrics.power_watts:.2f} W\n"
+                f"  Carbon: {metrics.carbon_grams(carbon.value):.4f} g CO2\n"
+            )
+
+        return result, metrics, decision
+
+    def _run(self, sql: str, variant: QueryVariant) -> Tuple[Any, EnergyMetrics]:
+        """Run a query's variant under the profiler"""
+        conn = self.compiler.get_connection(variant)
+        # Use optimized SQL if available; prepared outside the measurement
+        statement = self._statement(conn, variant.sql or sql)
 
         def run_query():
-            # Use optimized SQL if available
-            query_to_run = decision.selected_variant.sql or sql
-            return conn.execute(query_to_run).fetchall()
+            return conn.execute(statement).fetchall()
 
-        result, metrics = self.profiler.profile(run_query)
+        return self.profiler.profile(run_query)
 
-        # Step 6: Record metrics
+    def _record(
+        self,
+        sql: str,
+        urgency: QueryUrgency,
+        decision: SelectionDecision,
+        metrics: EnergyMetrics,
+        carbon: CarbonIntensity,
+    ):
+        """Add an execution to the metrics history"""
         self.metrics_collector.record(
             query=sql,
             variant=decision.selected_strategy.value,
@@ -163,25 +219,10 @@ class CarbonAwareQueryEngine:
             metadata={
                 "urgency": urgency.value,
                 "decision_reason": decision.reason,
-                "timestamp": datetime.now().isoformat(),
             },
         )
 
-        logger.info(
-            f"Query completed: {metrics.duration_ms:.2f}ms, {metrics.energy_joules:.2f}J"
-        )
-
-        if explain:
-            print(f"ACTUAL PERFORMANCE:")
-            print(f"  Energy: {metrics.energy_joules:.2f} J")
-            print(f"  Duration: {metrics.duration_ms:.2f} ms")
-            print(f"  Power: {metrics.power_watts:.2f} W")
-            print(f"  Carbon: {metrics.carbon_grams(carbon.value):.4f} g CO2")
-            print()
-
-        return result, metrics, decision
-
-    def compare_strategies(self, sql: str) -> dict:
+    def compare_strategies(self, sql: str) -> Dict[str, StrategyResult]:
         """
         Execute query with all strategies and compare results
 
@@ -189,7 +230,7 @@ class CarbonAwareQueryEngine:
             sql: SQL query to compare
 
         Returns:
-            Dictionary with strategy comparisons
+            StrategyResult per strategy name
         """
         logger.info("Running strategy comparison")
 
@@ -200,22 +241,48 @@ class CarbonAwareQueryEngine:
 
         for strategy, variant in variants.items():
             conn = self.compiler.get_connection(variant)
+            # Parsed and planned once, so no strategy is timed doing it
+            statement = self._statement(conn, sql)
 
             def run_query():
-                return conn.execute(sql).fetchall()
+                # Only the row count is reported, so skip building row tuples
+                return fetch_result(conn.execute(statement), "count")
 
-            result, metrics = self.profiler.profile(run_query)
+            result_count, metrics = self.profiler.profile(run_query)
 
-            results[strategy.value] = {
-                "energy_joules": metrics.energy_joules,
-                "duration_ms": metrics.duration_ms,
-                "power_watts": metrics.power_watts,
-                "carbon_grams": metrics.carbon_grams(carbon.value),
-                "result_count": len(result) if isinstance(result, list) else 1,
-            }
+            results[strategy.value] = StrategyResult(
+                metrics.energy_joules,
+                metrics.duration_ms,
+                metrics.power_watts,
+                metrics.carbon_grams(carbon.value),
+                result_count,
+            )
 
         return results
 
+    def _statement(self, conn, sql: str) -> str:
+        """SQL that runs `sql` on conn from a statement prepared the first time"""
+        if conn is not self._prepared_conn:
+            # A new connection has none of the old one's statements
+            self._prepared = {}
+            self._prepared_conn = conn
+
+        name = self._prepared.get(sql)
+        if name is None:
+            # PREPARE takes a single statement; anything else runs as is
+            if ";" in sql.rstrip().rstrip(";") or (
+                len(self._prepared) >= PREPARED_CACHE_SIZE
+            ):
+                return sql
+            name = f"engine_q{len(self._prepared)}"
+            try:
+                conn.execute(f"PREPARE {name} AS {sql}")
+            except duckdb.Error:
+                # Leave the error, if any, to the real execution
+                return sql
+            self._prepared[sql] = name
+        return f"EXECUTE {name}"
+
     def get_statistics(self) -> dict:
         """Get execution statistics"""
         return self.metrics_collector.summary()
@@ -305,7 +372,7 @@ if __name__ == "__main__":
 
     for strategy, metrics in comparison.items():
         print(f"\n{strategy.upper()}:")
-        for metric, value in metrics.items():
+        for metric, value in metrics._asdict().items():
             print(
                 f"  {metric}: {value:.2f}"
                 if isinstance(value, float)
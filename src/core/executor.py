@@ -1,33 +1,93 @@
 ﻿import duckdb
+import json
+from types import MappingProxyType
 from typing import Any, Tuple, Dict
 from time import perf_counter
 from src.monitoring.metrics import EnergyMetrics
 from src.optimizer.selector import ExecutionStrategy
 
+# Power drawn by a query at an energy factor of 1.0
+BASE_POWER_WATTS = 15.0
+
+# Energy factor of each strategy relative to BALANCED
+_FACTOR_BY_STRATEGY = MappingProxyType(
+    {
+        ExecutionStrategy.FAST: 1.4,
+        ExecutionStrategy.BALANCED: 1.0,
+        ExecutionStrategy.EFFICIENT: 0.6,
+    }
+)
+
+
+def _energy_model(factor: float, dur_ms: float) -> Tuple[float, float, float]:
+    """Simple energy model, energy ∝ duration * factor: (energy_j, dur_ms, power)"""
+    power = BASE_POWER_WATTS * factor
+    return power * dur_ms * 0.001, dur_ms, power
+
+
+def fetch_result(cursor, result_format: str = "tuples"):
+    """Fetch a query result as row tuples, an Arrow table, or its row count"""
+    if result_format == "tuples":
+        return cursor.fetchall()
+    if result_format == "arrow":
+        # Columnar, without a Python object per value; needs pyarrow
+        return cursor.fetch_arrow_table()
+    if result_format == "count":
+        # Fetched column-wise, so no tuple is built per row
+        columns = cursor.fetchnumpy()
+        return len(next(iter(columns.values()))) if columns else 0
+    raise ValueError(f"Unknown result format: {result_format}")
+
 
 class QueryExecutor:
-    def __init__(self, db_path: str = ":memory:"):
+    def __init__(
+        self,
+        db_path: str = ":memory:",
+        profile: bool = False,
+        seed_demo_data: bool = False,
+    ):
         self.conn = duckdb.connect(db_path)
-        # seed a tiny table if empty
-        self.conn.execute("CREATE TABLE IF NOT EXISTS t AS SELECT * FROM range(1000)")
+        if seed_demo_data:
+            # seed a tiny table for demos if empty
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS t AS SELECT * FROM range(1000)"
+            )
+        # DuckDB's own per-operator profile of the last query run on self.conn;
+        # needs a DuckDB that exposes get_profiling_information
+        self.profile = profile and hasattr(self.conn, "get_profiling_information")
+        self.last_profile = None
+        if self.profile:
+            self.conn.execute("PRAGMA enable_profiling='no_output'")
 
-    def _run(self, sql: str, factor: float) -> Tuple[list, EnergyMetrics]:
+    def _run(
+        self, sql: str, factor: float, conn=None, result_format: str = "tuples"
+    ) -> Tuple[Any, EnergyMetrics]:
         start = perf_counter()
-        result = self.conn.execute(sql).fetchall()
+        result = fetch_result((conn or self.conn).execute(sql), result_format)
+        # Wall time, so the fetch into Python counts too
         dur_ms = (perf_counter() - start) * 1000
-        # simple energy model: energy ∝ duration * factor
-        power = 15.0 * factor
-        energy_j = power * (dur_ms / 1000.0)
-        return result, EnergyMetrics(energy_j, dur_ms, power)
+        if self.profile and conn is None:
+            self.last_profile = json.loads(
+                self.conn.get_profiling_information(format="json")
+            )
+        return result, EnergyMetrics(*_energy_model(factor, dur_ms))
 
-    def execute(self, sql: str, strategy: ExecutionStrategy):
-        factor = {"fast": 1.4, "balanced": 1.0, "efficient": 0.6}[strategy.value]
-        return self._run(sql, factor)
+    def execute(
+        self,
+        sql: str,
+        strategy: ExecutionStrategy,
+        conn=None,
+        result_format: str = "tuples",
+    ):
+        return self._run(sql, _FACTOR_BY_STRATEGY[strategy], conn, result_format)
 
     def compare_variants(
         self, sql: str
     ) -> Dict[ExecutionStrategy, Tuple[list, EnergyMetrics]]:
-        out = {}
-        for s in ExecutionStrategy:
-            out[s] = self.execute(sql, s)
-        return out
+        # Strategies differ only in the energy model, not in what runs, so
+        # execute once and share the result across them
+        result, base = self._run(sql, 1.0)
+        return {
+            s: (result, EnergyMetrics(*_energy_model(factor, base.duration_ms)))
+            for s, factor in _FACTOR_BY_STRATEGY.items()
+        }
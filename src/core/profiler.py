@@ -1,21 +1,183 @@
 ﻿# src/core/profiler.py
+import ctypes
+import glob
+import os
+import platform
+import struct
+import threading
 import time
+import numpy as np
 import psutil
+from contextlib import nullcontext
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Callable, Any, Tuple, Optional, List
-import statistics
 
-# Try to import pyRAPL, fall back to estimation
-try:
-    import pyRAPL
+# Where the powercap driver exposes the Intel RAPL energy counters
+POWERCAP_ROOT = "/sys/class/powercap"
+# Where perf exposes the same counters as the "power" PMU
+PERF_POWER_PMU = "/sys/bus/event_source/devices/power"
+# perf_event_open(2) syscall numbers
+_PERF_EVENT_OPEN = {"x86_64": 298, "aarch64": 241}
+
+
+class RaplCounters:
+    """Package energy counters read straight from the powercap sysfs files"""
+
+    def __init__(self, root: str = POWERCAP_ROOT):
+        # (energy_uj fd, counter range) per package; the files stay open, so a
+        # reading is one pread per package
+        self.domains = []
+        for zone in sorted(glob.glob(os.path.join(root, "intel-rapl:*"))):
+            # intel-rapl:N is a package; intel-rapl:N:M are its subzones
+            if os.path.basename(zone).count(":") != 1:
+                continue
+            try:
+                with open(os.path.join(zone, "max_energy_range_uj")) as f:
+                    max_range = int(f.read())
+                fd = os.open(os.path.join(zone, "energy_uj"), os.O_RDONLY)
+            except (OSError, ValueError):
+                # energy_uj is readable by root only on many kernels
+                continue
+            self.domains.append((fd, max_range))
+
+    def read(self) -> Tuple[int, ...]:
+        """Current counter of every package, in microjoules"""
+        return tuple(int(os.pread(fd, 32, 0)) for fd, _ in self.domains)
+
+    def joules_since(self, start: Tuple[int, ...]) -> float:
+        """Energy used by all packages since the `start` reading"""
+        end = self.read()
+        # Counters wrap around at max_energy_range_uj
+        microjoules = sum(
+            (e - s) % max_range
+            for e, s, (_, max_range) in zip(end, start, self.domains)
+        )
+        return microjoules / 1_000_000
+
+
+def _cpu_list(spec: str) -> List[int]:
+    """CPUs in a sysfs CPU list such as 0,18 or 0-3"""
+    cpus = []
+    for part in spec.strip().split(","):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+class PerfRaplCounters:
+    """Package energy counters read through perf's power/energy-pkg event"""
+
+    def __init__(self, pmu: str = PERF_POWER_PMU):
+        # One perf fd per package; a reading is one 8-byte read() per package,
+        # with no text to parse, and the kernel extends the counter to 64 bits
+        self.domains = []
+        self.scale = 0.0
+        syscall_nr = _PERF_EVENT_OPEN.get(platform.machine())
+        if syscall_nr is None:
+            return
+        try:
+            with open(os.path.join(pmu, "type")) as f:
+                pmu_type = int(f.read())
+            with open(os.path.join(pmu, "events", "energy-pkg")) as f:
+                # e.g. "event=0x02"
+                config = int(f.read().strip().partition("=")[2], 0)
+            with open(os.path.join(pmu, "events", "energy-pkg.scale")) as f:
+                self.scale = float(f.read())  # Joules per count
+            # The PMU lists one CPU per package
+            with open(os.path.join(pmu, "cpumask")) as f:
+                cpus = _cpu_list(f.read())
+        except (OSError, ValueError):
+            return
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        # struct perf_event_attr, zeroed past type, size and config
+        attr_size = 128
+        attr = ctypes.create_string_buffer(
+            struct.pack("IIQ", pmu_type, attr_size, config), attr_size
+        )
+        for cpu in cpus:
+            # pid -1 with a cpu: count everything running on that package
+            fd = libc.syscall(syscall_nr, attr, -1, cpu, -1, 0)
+            if fd < 0:
+                # Needs CAP_PERFMON or perf_event_paranoid <= 0
+                self.close()
+                return
+            self.domains.append(fd)
+
+    def close(self):
+        """Release the perf events"""
+        for fd in self.domains:
+            os.close(fd)
+        self.domains = []
+
+    def read(self) -> Tuple[int, ...]:
+        """Current count of every package, in `scale` units"""
+        return tuple(struct.unpack("Q", os.read(fd, 8))[0] for fd in self.domains)
+
+    def joules_since(self, start: Tuple[int, ...]) -> float:
+        """Energy used by all packages since the `start` reading"""
+        return sum(e - s for e, s in zip(self.read(), start)) * self.scale
+
+
+def _open_rapl():
+    """The cheapest readable RAPL counters: perf first, then powercap sysfs"""
+    perf = PerfRaplCounters()
+    return perf if perf.domains else RaplCounters()
+
+
+# This process, and the CPUs its usage is measured against
+_PROCESS = psutil.Process()
+_NCPU = max(1, psutil.cpu_count() or 1)
+
+
+def _reset_process():
+    global _PROCESS
+    _PROCESS = psutil.Process()
+
+
+# A forked child (e.g. a benchmark pool worker) must not measure its parent
+os.register_at_fork(after_in_child=_reset_process)
+
+
+def _sample() -> Tuple[float, float]:
+    """CPU seconds used so far and resident memory in MB, in one procfs pass"""
+    with _PROCESS.oneshot():
+        cpu = _PROCESS.cpu_times()
+        rss = _PROCESS.memory_info().rss
+    return cpu.user + cpu.system, rss / 1024 / 1024
+
+
+def _cpu_percent(cpu_seconds: float, duration_ms: float) -> float:
+    """Share of the machine's CPU capacity used over a measured window"""
+    if duration_ms <= 0:
+        return 0.0
+    share = cpu_seconds / ((duration_ms / 1000) * _NCPU)
+    # CPU times tick in jiffies, which can overshoot on short windows
+    return min(100.0, 100 * share)
+
+
+# One profiled run: energy (J), duration (ms), CPU (%), memory delta (MB)
+_READING_DTYPE = np.dtype([("e", "f8"), ("d", "f8"), ("c", "f8"), ("m", "f8")])
+
+
+def _reading(metrics: "EnergyMetrics") -> tuple:
+    """A run's metrics as a _READING_DTYPE record"""
+    return (
+        metrics.energy_joules,
+        metrics.duration_ms,
+        metrics.cpu_percent,
+        metrics.memory_mb,
+    )
+
 
-    RAPL_AVAILABLE = True
-except ImportError:
-    RAPL_AVAILABLE = False
-    print("Warning: pyRAPL not available. Using CPU-based energy estimation.")
+_RAPL = _open_rapl()
+RAPL_AVAILABLE = bool(_RAPL.domains)
+if not RAPL_AVAILABLE:
+    print("Warning: RAPL counters not readable. Using CPU-based energy estimation.")
 
 
-@dataclass
+@dataclass(slots=True)
 class EnergyMetrics:
     """Energy and performance metrics from query execution"""
 
@@ -56,18 +218,14 @@ class EnergyProfiler:
             use_rapl: Whether to try using Intel RAPL (if available)
         """
         self.use_rapl = use_rapl and RAPL_AVAILABLE
-        self.rapl_meter = None
+        self.rapl = _RAPL if self.use_rapl else None
+        # The counters are package-wide, so one measurement at a time keeps
+        # concurrent queries from being charged for each other's energy
+        self.rapl_lock = threading.Lock()
 
         if self.use_rapl:
-            try:
-                pyRAPL.setup()
-                self.rapl_meter = pyRAPL.Measurement("query")
-                print("Energy profiling: Using Intel RAPL")
-            except Exception as e:
-                print(f"RAPL initialization failed: {e}")
-                self.use_rapl = False
-
-        if not self.use_rapl:
+            print("Energy profiling: Using Intel RAPL")
+        else:
             print("Energy profiling: Using CPU estimation")
 
     def profile(self, func: Callable, *args, **kwargs) -> Tuple[Any, EnergyMetrics]:
@@ -81,47 +239,49 @@ class EnergyProfiler:
         Returns:
             Tuple of (function_result, energy_metrics)
         """
-        # Get process for CPU monitoring
-        process = psutil.Process()
-        cpu_start = process.cpu_percent()
-        mem_start = process.memory_info().rss / 1024 / 1024  # MB
+        cpu_start, mem_start = _sample()
 
-        # Start energy measurement
-        if self.use_rapl:
-            self.rapl_meter.begin()
+        with self.rapl_lock if self.use_rapl else nullcontext():
+            # Start energy measurement
+            if self.use_rapl:
+                rapl_start = self.rapl.read()
 
-        # Execute function
-        start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        duration_ms = (time.perf_counter() - start_time) * 1000
+            # Execute function
+            start_time = time.perf_counter()
+            result = func(*args, **kwargs)
+            duration_ms = (time.perf_counter() - start_time) * 1000
 
-        # End energy measurement
-        if self.use_rapl:
-            self.rapl_meter.end()
-            # Convert microjoules to joules
-            energy_joules = self.rapl_meter.result.pkg[0] / 1_000_000
-        else:
+            # End energy measurement
+            if self.use_rapl:
+                energy_joules = self.rapl.joules_since(rapl_start)
+
+        # CPU time used over the measured window
+        cpu_end, mem_end = _sample()
+        cpu_percent = _cpu_percent(cpu_end - cpu_start, duration_ms)
+
+        if not self.use_rapl:
             # Estimate based on CPU usage
             # Assume average CPU TDP of 65W, scale by usage
-            cpu_avg = (cpu_start + process.cpu_percent()) / 2
-            estimated_power = 65 * (cpu_avg / 100)  # Watts
+            estimated_power = 65 * (cpu_percent / 100)  # Watts
             energy_joules = estimated_power * (duration_ms / 1000)
 
-        # Get final CPU/memory stats
-        cpu_end = process.cpu_percent()
-        mem_end = process.memory_info().rss / 1024 / 1024
-
         metrics = EnergyMetrics(
             energy_joules=energy_joules,
             duration_ms=duration_ms,
-            cpu_percent=(cpu_start + cpu_end) / 2,
+            cpu_percent=cpu_percent,
             memory_mb=mem_end - mem_start,
         )
 
         return result, metrics
 
     def profile_with_uncertainty(
-        self, func: Callable, iterations: int = 5, *args, **kwargs
+        self,
+        func: Callable,
+        iterations: int = 5,
+        *args,
+        min_duration_ms: float = 0.0,
+        warmup: bool = False,
+        **kwargs,
     ) -> Tuple[Any, EnergyMetrics, float]:
         """
         Profile a function multiple times to measure energy uncertainty
@@ -130,61 +290,73 @@ class EnergyProfiler:
             func: Function to profile
             iterations: Number of times to run (default 5)
             *args, **kwargs: Arguments to pass to function
+            min_duration_ms: Stop after the first run if it finishes faster
+                than this; repeat readings of sub-threshold runs are noise
+            warmup: Run once more beforehand, unmeasured, to absorb
+                cold-start costs
 
         Returns:
             Tuple of (result, average_metrics, energy_std_dev_joules)
         """
-        results = []
-        energy_readings = []
-        duration_readings = []
-        cpu_readings = []
-        memory_readings = []
+        readings = np.empty(iterations, dtype=_READING_DTYPE)
 
-        # Warmup run
-        func(*args, **kwargs)
+        if warmup:
+            func(*args, **kwargs)
 
+        result = None
+        n = 0
         for _ in range(iterations):
             res, met = self.profile(func, *args, **kwargs)
-            results.append(res)
-            energy_readings.append(met.energy_joules)
-            duration_readings.append(met.duration_ms)
-            cpu_readings.append(met.cpu_percent)
-            memory_readings.append(met.memory_mb)
+            if n == 0:
+                result = res
+            readings[n] = _reading(met)
+            n += 1
+            if met.duration_ms < min_duration_ms:
+                break
 
         # Calculate statistics
-        avg_energy = statistics.mean(energy_readings)
-        std_dev_energy = (
-            statistics.stdev(energy_readings) if len(energy_readings) > 1 else 0.0
-        )
+        readings = readings[:n]
 
         avg_metrics = EnergyMetrics(
-            energy_joules=avg_energy,
-            duration_ms=statistics.mean(duration_readings),
-            cpu_percent=statistics.mean(cpu_readings),
-            memory_mb=statistics.mean(memory_readings),
+            energy_joules=float(readings["e"].mean()),
+            duration_ms=float(readings["d"].mean()),
+            cpu_percent=float(readings["c"].mean()),
+            memory_mb=float(readings["m"].mean()),
         )
+        std_dev_energy = float(readings["e"].std(ddof=1)) if n > 1 else 0.0
 
-        return results[0], avg_metrics, std_dev_energy
+        return result, avg_metrics, std_dev_energy
 
     def profile_context(self):
         """Context manager for profiling"""
         return ProfilerContext(self)
 
 
+@lru_cache(maxsize=1)
+def shared_profiler() -> EnergyProfiler:
+    """Process-wide profiler, so RAPL is set up once however many engines run"""
+    return EnergyProfiler()
+
+
 class ProfilerContext:
     """Context manager for energy profiling"""
 
     def __init__(self, profiler: EnergyProfiler):
         self.profiler = profiler
         self.metrics = None
-        self.process = psutil.Process()
 
     def __enter__(self):
-        self.cpu_start = self.process.cpu_percent()
-        self.mem_start = self.process.memory_info().rss / 1024 / 1024
+        self.cpu_start, self.mem_start = _sample()
 
         if self.profiler.use_rapl:
-            self.profiler.rapl_meter.begin()
+            self.profiler.rapl_lock.acquire()
+            try:
+                self.rapl_start = self.profiler.rapl.read()
+            except BaseException:
+                # The profiler is shared process-wide; a held lock would
+                # deadlock every later profile
+                self.profiler.rapl_lock.release()
+                raise
 
         self.start_time = time.perf_counter()
         return self
@@ -193,20 +365,22 @@ class ProfilerContext:
         duration_ms = (time.perf_counter() - self.start_time) * 1000
 
         if self.profiler.use_rapl:
-            self.profiler.rapl_meter.end()
-            energy_joules = self.profiler.rapl_meter.result.pkg[0] / 1_000_000
-        else:
-            cpu_avg = (self.cpu_start + self.process.cpu_percent()) / 2
-            estimated_power = 65 * (cpu_avg / 100)
-            energy_joules = estimated_power * (duration_ms / 1000)
+            try:
+                energy_joules = self.profiler.rapl.joules_since(self.rapl_start)
+            finally:
+                self.profiler.rapl_lock.release()
 
-        cpu_end = self.process.cpu_percent()
-        mem_end = self.process.memory_info().rss / 1024 / 1024
+        cpu_end, mem_end = _sample()
+        cpu_percent = _cpu_percent(cpu_end - self.cpu_start, duration_ms)
+
+        if not self.profiler.use_rapl:
+            estimated_power = 65 * (cpu_percent / 100)
+            energy_joules = estimated_power * (duration_ms / 1000)
 
         self.metrics = EnergyMetrics(
             energy_joules=energy_joules,
             duration_ms=duration_ms,
-            cpu_percent=(self.cpu_start + cpu_end) / 2,
+            cpu_percent=cpu_percent,
             memory_mb=mem_end - self.mem_start,
         )
 
@@ -214,21 +388,24 @@ class ProfilerContext:
 # Test
 if __name__ == "__main__":
     profiler = EnergyProfiler()
-
-    def test_function():
-        """Test function that does some work"""
-        total = 0
-        for i in range(1000000):
-            total += i
-        return total
-
-    result, metrics = profiler.profile(test_function)
-
-    print(f"Result: {result}")
-    print(f"Energy: {metrics.energy_joules:.2f} J")
-    print(f"Duration: {metrics.duration_ms:.2f} ms")
-    print(f"Power: {metrics.power_watts:.2f} W")
-    print(f"Carbon (US avg): {metrics.carbon_grams():.4f} g CO2")
+    N = 1_000_000
+
+    # Near-empty, vectorized and idle workloads, so the profiler's own
+    # overhead shows rather than the interpreter's
+    workloads = [
+        ("closed form", lambda: N * (N - 1) // 2),
+        ("numpy", lambda: int(np.add.reduce(np.arange(N)))),
+        ("sleep 10ms", lambda: time.sleep(0.01)),
+    ]
+    for name, workload in workloads:
+        result, metrics = profiler.profile(workload)
+
+        print(f"\n{name}:")
+        print(f"Result: {result}")
+        print(f"Energy: {metrics.energy_joules:.2f} J")
+        print(f"Duration: {metrics.duration_ms:.2f} ms")
+        print(f"Power: {metrics.power_watts:.2f} W")
+        print(f"Carbon (US avg): {metrics.carbon_grams():.4f} g CO2")
 
     # Test context manager
     print("\nTesting context manager:")
@@ -1,7 +1,9 @@
 ﻿#!/usr/bin/env python3
 """Launcher for carbon-aware query engine"""
 
+import io
 import os
+import sys
 import argparse
 import duckdb
 
@@ -14,15 +16,16 @@ def create_sample_db(db_path: str, row_count: int = 100_000):
     if db_path != ":memory:":
         directory = os.path.dirname(db_path) or "."
         os.makedirs(directory, exist_ok=True)
-        if os.path.exists(db_path):
-            os.remove(db_path)
 
     print(f"Creating sample database at: {db_path} (rows: {row_count})")
     conn = duckdb.connect(database=db_path)
+    # Row order is irrelevant here; without it DuckDB generates and writes
+    # the rows in parallel on all cores
+    conn.execute("SET preserve_insertion_order = false")
 
     conn.execute(
         f"""
-        CREATE TABLE orders AS
+        CREATE OR REPLACE TABLE orders AS
         SELECT
             range AS order_id,
             (range % 1000) AS customer_id,
@@ -36,6 +39,12 @@ def create_sample_db(db_path: str, row_count: int = 100_000):
     print("Sample database created.")
 
 
+def _flush(buf: io.StringIO):
+    """Write a buffered block of output to stdout with a single write"""
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run carbon-aware query engine demo.")
     parser.add_argument(
@@ -86,30 +95,36 @@ def main():
     print("=" * 80)
 
     for sql, urgency, description in queries:
-        print(f"\n{'='*80}")
-        print(f"Query: {description}")
-        print(f"SQL (preview): {sql[:120]}{'...' if len(sql) > 120 else ''}")
-        print(f"Urgency: {urgency.value}")
-        print(f"{'='*80}")
+        # Each block is buffered and written in one go
+        buf = io.StringIO()
+        print(f"\n{'='*80}", file=buf)
+        print(f"Query: {description}", file=buf)
+        print(f"SQL (preview): {sql[:120]}{'...' if len(sql) > 120 else ''}", file=buf)
+        print(f"Urgency: {urgency.value}", file=buf)
+        print(f"{'='*80}", file=buf)
+        # Before executing, which prints its own explanation
+        _flush(buf)
 
         result, metrics, decision = engine.execute(sql, urgency, explain=True)
 
+        buf = io.StringIO()
         # Print brief results summary
         if result:
-            print(f"Results: {len(result)} rows")
+            print(f"Results: {len(result)} rows", file=buf)
 
         # ---- UPDATED METRICS BLOCK (YOUR FIX APPLIED HERE) ----
-        print("\nMetrics Summary:")
-        print(f"  Energy: {metrics.energy_joules:.4f} J")
-        print(f"  Duration: {metrics.duration_ms:.2f} ms")
-        print(f"  Power: {metrics.power_watts:.4f} W")
-        print(f"  CPU: {metrics.cpu_percent:.1f}%")
-        print(f"  Memory: {metrics.memory_mb:.2f} MB")
+        print("\nMetrics Summary:", file=buf)
+        print(f"  Energy: {metrics.energy_joules:.4f} J", file=buf)
+        print(f"  Duration: {metrics.duration_ms:.2f} ms", file=buf)
+        print(f"  Power: {metrics.power_watts:.4f} W", file=buf)
+        print(f"  CPU: {metrics.cpu_percent:.1f}%", file=buf)
+        print(f"  Memory: {metrics.memory_mb:.2f} MB", file=buf)
         # -------------------------------------------------------
 
         if decision:
-            print("Execution decision / plan summary:")
-            print(f"  {decision}")
+            print("Execution decision / plan summary:", file=buf)
+            print(f"  {decision}", file=buf)
+        _flush(buf)
 
     # Engine statistics
     print("\n" + "=" * 80)
@@ -132,13 +147,15 @@ def main():
 
     try:
         comparison = engine.compare_strategies(comparison_sql)
+        buf = io.StringIO()
         for strategy, metrics_dict in comparison.items():
-            print(f"\n{strategy.upper()}:")
-            for metric, value in metrics_dict.items():
+            print(f"\n{strategy.upper()}:", file=buf)
+            for metric, value in metrics_dict._asdict().items():
                 if isinstance(value, float):
-                    print(f"  {metric}: {value:.2f}")
+                    print(f"  {metric}: {value:.2f}", file=buf)
                 else:
-                    print(f"  {metric}: {value}")
+                    print(f"  {metric}: {value}", file=buf)
+        _flush(buf)
     except Exception as e:
         print(f"Could not run strategy comparison: {e!r}")
 
@@ -1,6 +1,5 @@
 """Database models for energy ML project"""
 
-from datetime import datetime
 from typing import Optional
 from sqlalchemy import (
     Column,
@@ -13,13 +12,41 @@ from sqlalchemy import (
     ForeignKey,
     Text,
     Enum,
+    Index,
+    DDL,
+    event,
+    text,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql.functions import FunctionElement
 import enum
 
 Base = declarative_base()
 
 
+class utcnow(FunctionElement):
+    """Current UTC time, read from the database's clock as a naive timestamp"""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+# Postgres channel the scheduler worker LISTENs on for newly scheduled queries
+SCHEDULED_QUERY_CHANNEL = "scheduled_query_ready"
+
+
 class QueryUrgencyEnum(enum.Enum):
     """Query urgency levels"""
 
@@ -60,8 +87,8 @@ class User(Base):
     full_name = Column(String(255))
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
 
     # Relationships
     queries = relationship("QueryExecution", back_populates="user")
@@ -78,7 +105,7 @@ class APIKey(Base):
     key = Column(String(255), unique=True, index=True, nullable=False)
     name = Column(String(100))
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
     expires_at = Column(DateTime, nullable=True)
     last_used_at = Column(DateTime, nullable=True)
 
@@ -90,6 +117,21 @@ class QueryExecution(Base):
     """Query execution records"""
 
     __tablename__ = "query_executions"
+    __table_args__ = (
+        # Serves per-user history pages, scanned backwards for newest-first
+        Index("ix_query_executions_user_id_id", "user_id", "id"),
+        # Lets the emissions summary read a time window from the index alone
+        # on Postgres
+        Index(
+            "ix_query_executions_executed_at_cover",
+            "executed_at",
+            postgresql_include=[
+                "estimated_emissions_gco2",
+                "execution_time_ms",
+                "carbon_intensity_gco2_kwh",
+            ],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -116,8 +158,8 @@ class QueryExecution(Base):
     explain_json = Column(JSON)
 
     # Metadata
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
 
     # Relationships
     user = relationship("User", back_populates="queries")
@@ -154,7 +196,7 @@ class QueryMetrics(Base):
     balanced_plan_energy_j = Column(Float)
     efficient_plan_energy_j = Column(Float)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
 
     # Relationships
     query = relationship("QueryExecution", back_populates="metrics")
@@ -164,6 +206,11 @@ class CarbonIntensityData(Base):
     """Historical carbon intensity data"""
 
     __tablename__ = "carbon_intensity_data"
+    __table_args__ = (
+        # Recent readings for a zone, newest first, come from one range scan
+        # however much history the table holds
+        Index("ix_carbon_intensity_data_zone_timestamp", "zone", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     zone = Column(String(50), index=True, nullable=False)
@@ -176,12 +223,7 @@ class CarbonIntensityData(Base):
     data_source = Column(String(100))  # e.g., 'electricitymaps', 'fallback_model'
     is_forecast = Column(Boolean, default=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    class Config:
-        indexes = [
-            ("zone", "timestamp"),  # Composite index
-        ]
+    created_at = Column(DateTime, default=utcnow())
 
 
 class SystemMetrics(Base):
@@ -190,7 +232,7 @@ class SystemMetrics(Base):
     __tablename__ = "system_metrics"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, index=True, default=datetime.utcnow)
+    timestamp = Column(DateTime, index=True, default=utcnow())
 
     # System stats
     total_queries = Column(Integer, default=0)
@@ -216,6 +258,17 @@ class ScheduledQuery(Base):
     """Queries scheduled for future execution"""
 
     __tablename__ = "scheduled_queries"
+    __table_args__ = (
+        # Workers only ever scan rows that can still run; on Postgres the
+        # index holds just those, and matches the worker's filter exactly
+        Index(
+            "ix_scheduled_queries_due",
+            "scheduled_for",
+            postgresql_where=text(
+                "is_executed = false AND execution_attempts < max_attempts"
+            ),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     query_execution_id = Column(Integer, ForeignKey("query_executions.id"))
@@ -227,6 +280,33 @@ class ScheduledQuery(Base):
     is_executed = Column(Boolean, default=False)
     execution_attempts = Column(Integer, default=0)
     max_attempts = Column(Integer, default=3)
+    # Set when a worker claims the row; stale claims are retried
+    claimed_at = Column(DateTime)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
+
+    # Relationships
+    query_execution = relationship("QueryExecution")
+
+
+# Postgres only: NOTIFY the worker whenever a query is (re)scheduled, so it
+# can wake up instead of polling the table
+event.listen(
+    ScheduledQuery.__table__,
+    "after_create",
+    DDL(
+        f"""
+CREATE OR REPLACE FUNCTION notify_scheduled_query_ready() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{SCHEDULED_QUERY_CHANNEL}', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER scheduled_query_ready
+    AFTER INSERT OR UPDATE OF scheduled_for ON scheduled_queries
+    FOR EACH ROW EXECUTE FUNCTION notify_scheduled_query_ready();
+"""
+    ).execute_if(dialect="postgresql"),
+)
@@ -1,55 +1,105 @@
-﻿import pandas as pd
+﻿import argparse
+import duckdb
+import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from src.core.engine import CarbonAwareQueryEngine
 from src.optimizer.selector import QueryUrgency
 from evaluation.benchmarks.tpch_queries import TPCHBenchmark
 
 
+# Column order of each experiment's rows. Baseline and carbon rows always
+# report 0.0 carbon_grams, so that column is added once when saving.
+BASELINE_COLS = (
+    "query",
+    "iteration",
+    "approach",
+    "strategy",
+    "energy_joules",
+    "duration_ms",
+)
+CARBON_COLS = (
+    "query",
+    "iteration",
+    "carbon_level",
+    "carbon_intensity",
+    "urgency",
+    "strategy",
+    "energy_joules",
+    "duration_ms",
+)
+# Deferred runs leave the measurements empty, the others defer_minutes
+URGENCY_COLS = (
+    "query",
+    "iteration",
+    "urgency",
+    "strategy",
+    "defer_minutes",
+    "energy_joules",
+    "duration_ms",
+    "carbon_grams",
+    "deferred",
+)
+
+
+# Carbon intensities within one bucket lead to the same decisions
+CARBON_BUCKET_GCO2_KWH = 50
+
+
 class ExperimentRunner:
-    def __init__(self, output_dir: str = "data/results"):
+    def __init__(self, output_dir: str = "data/results", use_cache: bool = True):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.engine = CarbonAwareQueryEngine()
+        # One connection holds the TPC-H views and runs every experiment
+        self.conn = duckdb.connect(":memory:")
+        self.engine = CarbonAwareQueryEngine(conn=self.conn)
         self.benchmark = TPCHBenchmark(scale_factor=0.01)
-        self.results: List[Dict] = []
+        self.queries = self.benchmark.get_queries()
+        # The experiments overlap, e.g. every one runs the first queries at
+        # HIGH urgency; the n-th run of a query at an urgency and carbon
+        # level is measured once and reused by the others
+        self.use_cache = use_cache
+        self._exec_cache: Dict[Tuple[str, QueryUrgency, int, int], Tuple] = {}
+        # Rows as plain tuples, turned into one DataFrame when saving
+        self._baseline_rows: List[Tuple] = []
+        self._carbon_rows: List[Tuple] = []
+        self._urgency_rows: List[Tuple] = []
 
     def setup(self):
         if not (Path("data/tpch") / "lineitem.parquet").exists():
             self.benchmark.generate_data()
-        import duckdb
+        self.benchmark.load_data(self.conn)
 
-        conn = duckdb.connect(":memory:")
-        self.benchmark.load_data(conn)
-        conn.close()
+    def _execute(self, sql: str, urgency: QueryUrgency, iteration: int) -> Tuple:
+        """engine.execute_query, shared between experiments unless caching is off"""
+        if not self.use_cache:
+            return self.engine.execute_query(sql, urgency)
+        carbon = self.engine.carbon_api.get_current_intensity().value
+        key = (sql, urgency, int(carbon // CARBON_BUCKET_GCO2_KWH), iteration)
+        result = self._exec_cache.get(key)
+        if result is None:
+            result = self._exec_cache[key] = self.engine.execute_query(sql, urgency)
+        return result
 
     def run_baseline_comparison(self, iterations: int = 3):
-        queries = self.benchmark.get_queries()
-        for qn, sql in queries.items():
+        for qn, sql in self.queries.items():
             for i in range(iterations):
-                _, mf, _ = self.engine.execute_query(sql, QueryUrgency.HIGH)
-                _, ma, dec = self.engine.execute_query(sql, QueryUrgency.MEDIUM)
-                self.results += [
-                    {
-                        "query": qn,
-                        "iteration": i,
-                        "approach": "baseline",
-                        "strategy": "fast",
-                        "energy_joules": mf.energy_joules,
-                        "duration_ms": mf.duration_ms,
-                        "carbon_grams": 0.0,
-                    },
-                    {
-                        "query": qn,
-                        "iteration": i,
-                        "approach": "carbon_aware",
-                        "strategy": dec.selected_strategy.value,
-                        "energy_joules": ma.energy_joules,
-                        "duration_ms": ma.duration_ms,
-                        "carbon_grams": 0.0,
-                    },
+                # Each arm gets its own run, even when both pick the same
+                # strategy, so the comparison's variance is not understated
+                _, mf, _ = self._execute(sql, QueryUrgency.HIGH, i)
+                _, ma, dec = self._execute(sql, QueryUrgency.MEDIUM, i)
+                self._baseline_rows += [
+                    (qn, i, "baseline", "fast", mf.energy_joules, mf.duration_ms),
+                    (
+                        qn,
+                        i,
+                        "carbon_aware",
+                        dec.selected_strategy.value,
+                        ma.energy_joules,
+                        ma.duration_ms,
+                    ),
                 ]
 
     def run_carbon_intensity_experiments(self, iterations: int = 2):
@@ -58,27 +108,26 @@ class ExperimentRunner:
             ("medium", 400, QueryUrgency.MEDIUM),
             ("high", 600, QueryUrgency.HIGH),
         ]
-        queries = list(self.benchmark.get_queries().items())[:2]
+        queries = list(self.queries.items())[:2]
         for qn, sql in queries:
             for name, val, urg in levels:
                 for i in range(iterations):
-                    _, m, dec = self.engine.execute_query(sql, urg)
-                    self.results.append(
-                        {
-                            "query": qn,
-                            "iteration": i,
-                            "carbon_level": name,
-                            "carbon_intensity": val,
-                            "urgency": urg.value,
-                            "strategy": dec.selected_strategy.value,
-                            "energy_joules": m.energy_joules,
-                            "duration_ms": m.duration_ms,
-                            "carbon_grams": 0.0,
-                        }
+                    _, m, dec = self._execute(sql, urg, i)
+                    self._carbon_rows.append(
+                        (
+                            qn,
+                            i,
+                            name,
+                            val,
+                            urg.value,
+                            dec.selected_strategy.value,
+                            m.energy_joules,
+                            m.duration_ms,
+                        )
                     )
 
     def run_urgency_experiments(self, iterations: int = 2):
-        queries = list(self.benchmark.get_queries().items())[:2]
+        queries = list(self.queries.items())[:2]
         for qn, sql in queries:
             for urg in [
                 QueryUrgency.CRITICAL,
@@ -88,37 +137,34 @@ class ExperimentRunner:
                 QueryUrgency.BATCH,
             ]:
                 for i in range(iterations):
-                    res = self.engine.execute_query(sql, urg)
+                    res = self._execute(sql, urg, i)
                     _, m, dec = res
+                    strategy = dec.selected_strategy.value
                     if dec.should_defer:
-                        self.results.append(
-                            {
-                                "query": qn,
-                                "iteration": i,
-                                "urgency": urg.value,
-                                "strategy": dec.selected_strategy.value,
-                                "defer_minutes": dec.defer_minutes,
-                                "deferred": True,
-                            }
+                        self._urgency_rows.append(
+                            (qn, i, urg.value, strategy, dec.defer_minutes)
+                            + (None, None, None, True)
                         )
                     else:
-                        self.results.append(
-                            {
-                                "query": qn,
-                                "iteration": i,
-                                "urgency": urg.value,
-                                "strategy": dec.selected_strategy.value,
-                                "energy_joules": m.energy_joules,
-                                "duration_ms": m.duration_ms,
-                                "carbon_grams": 0.0,
-                                "deferred": False,
-                            }
+                        self._urgency_rows.append(
+                            (qn, i, urg.value, strategy, None)
+                            + (m.energy_joules, m.duration_ms, 0.0, False)
                         )
 
     def save_results(self) -> str:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         out = self.output_dir / f"experiments_{ts}.csv"
-        pd.DataFrame(self.results).to_csv(out, index=False)
+        baseline = pd.DataFrame.from_records(self._baseline_rows, columns=BASELINE_COLS)
+        carbon = pd.DataFrame.from_records(self._carbon_rows, columns=CARBON_COLS)
+        baseline["carbon_grams"] = carbon["carbon_grams"] = 0.0
+        frames = [
+            baseline,
+            carbon,
+            pd.DataFrame.from_records(self._urgency_rows, columns=URGENCY_COLS),
+        ]
+        pd.concat(frames, ignore_index=True).to_csv(
+            out, index=False, lineterminator="\n"
+        )
         return str(out)
 
     def run_all_experiments(self):
@@ -127,8 +173,17 @@ class ExperimentRunner:
         self.run_carbon_intensity_experiments()
         self.run_urgency_experiments()
         path = self.save_results()
+        self.engine.close()
+        self.conn.close()
         print(f"Saved results: {path}")
 
 
 if __name__ == "__main__":
-    ExperimentRunner().run_all_experiments()
+    parser = argparse.ArgumentParser(description="Run the carbon-aware experiments.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Measure every run, even those another experiment already made",
+    )
+    args = parser.parse_args()
+    ExperimentRunner(use_cache=not args.no_cache).run_all_experiments()
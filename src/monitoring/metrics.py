@@ -1,11 +1,17 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from collections import deque
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 import json
+import math
+import time
 from datetime import datetime
 
+# Most recent executions a collector keeps; older ones drop off
+MAX_HISTORY = 10_000
 
-@dataclass
+
+@dataclass(slots=True)
 class EnergyMetrics:
     energy_joules: float
     duration_ms: float
@@ -19,8 +25,12 @@ class EnergyMetrics:
 
 
 class MetricsCollector:
-    def __init__(self) -> None:
-        self.metrics_history: List[Dict[str, Any]] = []
+    def __init__(self, max_history: int = MAX_HISTORY) -> None:
+        # Raw entries in a ring buffer; rows are built only when read
+        self._entries = deque(maxlen=max_history)
+        # Running totals over the buffer, so summary() needn't rescan it
+        self._totals = [0.0, 0.0, 0.0]  # energy, duration, carbon
+        self._until_resum = max_history
 
     def record(
         self,
@@ -31,31 +41,63 @@ class MetricsCollector:
         carbon_intensity: float,
         metadata: Optional[Dict[str, Any]] = None,
     ):
+        entries = self._entries
+        totals = self._totals
+        if len(entries) == entries.maxlen:
+            _, _, _, old, _, old_carbon, _ = entries[0]
+            totals[0] -= old.energy_joules
+            totals[1] -= old.duration_ms
+            totals[2] -= old_carbon
+        # Carbon is worked out once here, then reused by totals and rows
+        carbon = metrics.carbon_grams(carbon_intensity)
+        entries.append(
+            (time.time(), query, variant, metrics, carbon_intensity, carbon, metadata)
+        )
+        totals[0] += metrics.energy_joules
+        totals[1] += metrics.duration_ms
+        totals[2] += carbon
+
+        # Adding and removing leaves rounding error behind; once the buffer
+        # has turned over, total it afresh
+        self._until_resum -= 1
+        if not self._until_resum:
+            self._until_resum = entries.maxlen
+            self._totals = [
+                math.fsum(entry[3].energy_joules for entry in entries),
+                math.fsum(entry[3].duration_ms for entry in entries),
+                math.fsum(entry[5] for entry in entries),
+            ]
+
+    @property
+    def metrics_history(self) -> List[Dict[str, Any]]:
+        return [self._row(*entry) for entry in self._entries]
+
+    @staticmethod
+    def _row(ts, query, variant, metrics, carbon_intensity, carbon_grams, metadata):
         row = {
-            "ts": datetime.utcnow().isoformat(),
+            "ts": datetime.utcfromtimestamp(ts).isoformat(),
             "query": query,
             "variant": variant,
             "energy_joules": metrics.energy_joules,
             "duration_ms": metrics.duration_ms,
             "power_watts": metrics.power_watts,
-            "carbon_grams": metrics.carbon_grams(carbon_intensity),
+            "carbon_grams": carbon_grams,
             "carbon_intensity": carbon_intensity,
         }
         if metadata:
             row["metadata"] = metadata
-        self.metrics_history.append(row)
+        return row
 
     def summary(self) -> Dict[str, Any]:
-        if not self.metrics_history:
+        count = len(self._entries)
+        if not count:
             return {}
-        e = [r["energy_joules"] for r in self.metrics_history]
-        d = [r["duration_ms"] for r in self.metrics_history]
-        c = [r["carbon_grams"] for r in self.metrics_history]
+        energy, duration, carbon = self._totals
         return {
-            "count": len(self.metrics_history),
-            "total_energy_joules": sum(e),
-            "avg_duration_ms": sum(d) / len(d),
-            "total_carbon_grams": sum(c),
+            "count": count,
+            "total_energy_joules": energy,
+            "avg_duration_ms": duration / count,
+            "total_carbon_grams": carbon,
         }
 
     def save(self, filename: Optional[str] = None) -> str:
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from typing import Optional, List
 
 
-@dataclass
+@dataclass(slots=True)
 class CarbonIntensity:
     value: float  # gCO2/kWh
     timestamp: datetime
@@ -18,36 +18,42 @@ class CarbonIntensity:
         return self.value > threshold
 
 
+def _intensity_for_hour(h: int) -> float:
+    """Fallback carbon intensity (gCO2/kWh) for an hour of the day"""
+    # simple fallback curve
+    if 10 <= h <= 16:
+        return 220 + abs(h - 13) * 25
+    if 17 <= h <= 21:
+        return 520 + (h - 17) * 20
+    return 380
+
+
+# The curve for every hour of the day, looked up by index
+_HOURLY_INTENSITY = tuple(_intensity_for_hour(h) for h in range(24))
+
+
 class CarbonAPI:
     def __init__(self, zone: str = "US-CAL-CISO"):
         self.zone = zone
 
     def get_current_intensity(self) -> CarbonIntensity:
-        # simple fallback curve
-        h = datetime.now().hour
-        if 10 <= h <= 16:
-            val = 220 + abs(h - 13) * 25
-        elif 17 <= h <= 21:
-            val = 520 + (h - 17) * 20
-        else:
-            val = 380
-        return CarbonIntensity(val, datetime.now(), self.zone, "historical_pattern")
+        now = datetime.now()
+        return CarbonIntensity(
+            _HOURLY_INTENSITY[now.hour], now, self.zone, "historical_pattern"
+        )
 
     def get_forecast(self, hours: int = 24) -> List[CarbonIntensity]:
-        now = datetime.now()
-        now = datetime.now()
+        # Simple forecast simulation: the current intensity, held flat
+        current = self.get_current_intensity()
         forecast = []
         for i in range(hours):
             # Uncertainty increases with time: base 10 + 5 per hour
             uncertainty = 10.0 + (i * 5.0)
 
-            # Simple forecast simulation
-            current = self.get_current_intensity()
-
             forecast.append(
-                current.__class__(
+                CarbonIntensity(
                     value=current.value,
-                    timestamp=now + timedelta(hours=i),
+                    timestamp=current.timestamp + timedelta(hours=i),
                     zone=self.zone,
                     source="forecast",
                     uncertainty=uncertainty,
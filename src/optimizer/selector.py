@@ -1,14 +1,21 @@
 # src/optimizer/selector.py
 from enum import Enum
+from operator import attrgetter
 from typing import Dict, Optional
 from dataclasses import dataclass
 import logging
+import time
 
 from src.core.compiler import ExecutionStrategy, QueryVariant
 from src.optimizer.carbon_api import CarbonAPI, CarbonIntensity
 
 logger = logging.getLogger(__name__)
 
+# kWh per joule
+_INV_KWH_J = 1.0 / 3_600_000
+# How long one forecast serves deferral decisions; forecasts are hourly
+FORECAST_TTL_SECONDS = 300
+
 
 class QueryUrgency(Enum):
     """Query urgency levels"""
@@ -20,16 +27,20 @@ class QueryUrgency(Enum):
     BATCH = "batch"
 
     def to_int(self) -> int:
-        return {
-            "critical": 5,
-            "high": 4,
-            "medium": 3,
-            "low": 2,
-            "batch": 1,
-        }[self.value]
+        return _URGENCY_RANK[self]
+
 
+# Urgency as a number, higher is more urgent
+_URGENCY_RANK = {
+    QueryUrgency.CRITICAL: 5,
+    QueryUrgency.HIGH: 4,
+    QueryUrgency.MEDIUM: 3,
+    QueryUrgency.LOW: 2,
+    QueryUrgency.BATCH: 1,
+}
 
-@dataclass
+
+@dataclass(slots=True)
 class SelectionContext:
     """Context for variant selection"""
 
@@ -39,7 +50,7 @@ class SelectionContext:
     available_variants: Dict[ExecutionStrategy, QueryVariant]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SelectionDecision:
     """Decision about which variant to use"""
 
@@ -94,6 +105,17 @@ class Strategies:
         return "efficient"
 
 
+# Strategies that run immediately, with the reason they are given
+_IMMEDIATE = {
+    "fast": (ExecutionStrategy.FAST, "Strategy selected: FAST (Latency‑First)"),
+    "efficient": (
+        ExecutionStrategy.EFFICIENT,
+        "Strategy selected: EFFICIENT (Balanced Hybrid)",
+    ),
+    "balanced": (ExecutionStrategy.BALANCED, "Strategy selected: BALANCED"),
+}
+
+
 def select_execution_strategy(urgency: int, carbon_intensity: float) -> str:
     """
     Select execution strategy based on urgency and carbon intensity.
@@ -109,56 +131,27 @@ class CarbonAwareSelector:
         self.carbon_api = carbon_api or CarbonAPI()
         self.LOW_CARBON = 250
         self.HIGH_CARBON = 500
+        # (expires_at, lowest-valued entry) of the last 6-hour forecast
+        self._forecast_min = None
 
     def select(self, context: SelectionContext) -> SelectionDecision:
         """Select optimal variant based on context"""
         urgency_val = context.urgency.to_int()
         carbon_val = context.carbon_intensity.value
         decision_str = select_execution_strategy(urgency_val, carbon_val)
-        if decision_str == "fast":
-            return self._select_fast(context, "Strategy selected: FAST (Latency‑First)")
-        if decision_str == "efficient":
-            return self._select_efficient(
-                context, "Strategy selected: EFFICIENT (Balanced Hybrid)"
-            )
         if decision_str == "defer":
             return self._select_defer(context, carbon_val)
-        # Default to balanced
-        return self._select_balanced(
-            context, f"Strategy selected: {decision_str.upper()}"
-        )
-
-    def _select_fast(self, context: SelectionContext, reason: str) -> SelectionDecision:
-        """Select FAST variant (equivalent to old _select_critical logic)"""
-        strategy = ExecutionStrategy.FAST
-        variant = context.available_variants[strategy]
-        return SelectionDecision(
-            selected_strategy=strategy,
-            selected_variant=variant,
-            reason=reason,
-            expected_energy=variant.estimated_energy,
-            expected_carbon=self._estimate_carbon(variant, context.carbon_intensity),
+        # Anything else runs now; unknown strategies default to balanced
+        strategy, reason = _IMMEDIATE.get(
+            decision_str,
+            (ExecutionStrategy.BALANCED, f"Strategy selected: {decision_str.upper()}"),
         )
+        return self._select_variant(context, strategy, reason)
 
-    def _select_efficient(
-        self, context: SelectionContext, reason: str
+    def _select_variant(
+        self, context: SelectionContext, strategy: ExecutionStrategy, reason: str
     ) -> SelectionDecision:
-        """Select EFFICIENT variant"""
-        strategy = ExecutionStrategy.EFFICIENT
-        variant = context.available_variants[strategy]
-        return SelectionDecision(
-            selected_strategy=strategy,
-            selected_variant=variant,
-            reason=reason,
-            expected_energy=variant.estimated_energy,
-            expected_carbon=self._estimate_carbon(variant, context.carbon_intensity),
-        )
-
-    def _select_balanced(
-        self, context: SelectionContext, reason: str
-    ) -> SelectionDecision:
-        """Select BALANCED variant"""
-        strategy = ExecutionStrategy.BALANCED
+        """Select the variant of a strategy to run right away"""
         variant = context.available_variants[strategy]
         return SelectionDecision(
             selected_strategy=strategy,
@@ -185,10 +178,8 @@ class CarbonAwareSelector:
             f"Carbon ({current_carbon:.0f}) > 400. Deferring 60m (forecast unavailable)"
         )
         try:
-            forecast = self.carbon_api.get_forecast(hours=6)
-            if forecast:
-                # Find the forecast entry with the lowest carbon intensity
-                min_forecast = min(forecast, key=lambda f: f.value)
+            min_forecast = self._lowest_forecast()
+            if min_forecast is not None:
                 lower_bound = min_forecast.value - min_forecast.uncertainty
                 if lower_bound < 400:
                     defer_minutes = 0
@@ -218,10 +209,20 @@ class CarbonAwareSelector:
             expected_carbon=self._estimate_carbon(variant, context.carbon_intensity),
         )
 
+    def _lowest_forecast(self) -> Optional[CarbonIntensity]:
+        """Lowest-intensity entry of the next 6 hours' forecast, reused for a while"""
+        now = time.monotonic()
+        if self._forecast_min is not None and now < self._forecast_min[0]:
+            return self._forecast_min[1]
+        forecast = self.carbon_api.get_forecast(hours=6)
+        lowest = min(forecast, key=attrgetter("value")) if forecast else None
+        self._forecast_min = (now + FORECAST_TTL_SECONDS, lowest)
+        return lowest
+
+    @staticmethod
     def _estimate_carbon(
-        self, variant: QueryVariant, carbon_intensity: CarbonIntensity
+        variant: QueryVariant, carbon_intensity: CarbonIntensity
     ) -> float:
         if variant.estimated_energy is None:
             return 0.0
-        kwh = variant.estimated_energy / 3_600_000
-        return kwh * carbon_intensity.value
+        return variant.estimated_energy * _INV_KWH_J * carbon_intensity.value
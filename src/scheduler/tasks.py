@@ -1,9 +1,34 @@
 from src.scheduler.app import celery_app
 import time
 import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from src.db.database import get_db_context, DatabaseManager
+from src.db.models import ScheduledQuery, QueryStatusEnum, QueryUrgencyEnum
+from src.optimizer.selector import QueryUrgency
 
 logger = logging.getLogger(__name__)
 
+# Delay before retrying a failed scheduled query; it doubles with each attempt
+MIN_RETRY_SECONDS = 30
+
+# Map stored urgencies to selector urgencies
+URGENCY_MAP = {
+    QueryUrgencyEnum.LOW: QueryUrgency.LOW,
+    QueryUrgencyEnum.MEDIUM: QueryUrgency.MEDIUM,
+    QueryUrgencyEnum.HIGH: QueryUrgency.HIGH,
+    QueryUrgencyEnum.CRITICAL: QueryUrgency.CRITICAL,
+}
+
+
+@lru_cache(maxsize=1)
+def _query_engine():
+    """One query engine per Celery worker process, built on first use"""
+    from src.core.engine import CarbonAwareQueryEngine
+
+    return CarbonAwareQueryEngine()
+
 
 @celery_app.task
 def execute_deferred_query(query_id: int):
@@ -15,3 +40,66 @@ def execute_deferred_query(query_id: int):
     # Simulate execution
     time.sleep(1)
     return f"Query {query_id} executed"
+
+
+@celery_app.task
+def run_scheduled(scheduled_id: int):
+    """
+    Run a scheduled query the scheduler has claimed and record the outcome.
+
+    A failure releases the claim and reschedules the query with a backoff,
+    until it runs out of attempts; a worker dying mid-run leaves the claim to
+    time out.
+    """
+    with get_db_context() as db:
+        scheduled_query = db.get(ScheduledQuery, scheduled_id)
+        if scheduled_query is None or scheduled_query.is_executed:
+            return
+
+        query_exec = scheduled_query.query_execution
+        if not query_exec:
+            logger.error(
+                f"Query execution {scheduled_query.query_execution_id} not found"
+            )
+            return
+
+        logger.info(
+            f"Executing scheduled query {query_exec.id}: {query_exec.query_text[:50]}..."
+        )
+        scheduled_query.execution_attempts += 1
+
+        try:
+            # Update status to running
+            query_exec.status = QueryStatusEnum.RUNNING
+            db.commit()
+
+            urgency = URGENCY_MAP.get(query_exec.urgency, QueryUrgency.MEDIUM)
+
+            # Execute query
+            result, metrics, decision = _query_engine().execute_query(
+                query=query_exec.query_text, urgency=urgency, explain=True
+            )
+
+            # Update query execution record
+            DatabaseManager.update_query_metrics(
+                db=db,
+                query_id=query_exec.id,
+                execution_time=metrics.get("execution_time_ms", 0),
+                energy=metrics.get("energy_joules", 0),
+                carbon_intensity=decision.carbon_intensity,
+                emissions=metrics.get("estimated_emissions_gco2", 0),
+                plan=decision.selected_plan,
+                decision_reason=decision.reason,
+            )
+        except Exception as e:
+            logger.error(f"Error executing query {query_exec.id}: {e}")
+            db.rollback()
+            query_exec.status = QueryStatusEnum.FAILED
+            scheduled_query.claimed_at = None
+            scheduled_query.scheduled_for = datetime.utcnow() + timedelta(
+                seconds=MIN_RETRY_SECONDS * 2**scheduled_query.execution_attempts
+            )
+            return
+
+        scheduled_query.is_executed = True
+        logger.info(f"Successfully executed query {query_exec.id}")
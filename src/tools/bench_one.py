@@ -4,7 +4,7 @@ from src.core.compiler import ExecutionStrategy
 
 if __name__ == "__main__":
     sql = sys.argv[1] if len(sys.argv) > 1 else "SELECT 42"
-    ex = QueryExecutor()
+    ex = QueryExecutor(seed_demo_data=True)
     for strat in (
         ExecutionStrategy.FAST,
         ExecutionStrategy.BALANCED,
@@ -1,41 +1,57 @@
-﻿from typing import Dict
-import sqlparse
+﻿from functools import lru_cache
+from typing import Dict
 
+# Distinct SQL strings whose analysis is kept
+ANALYSIS_CACHE_SIZE = 4096
 
-class QueryAnalyzer:
-    def analyze(self, sql: str) -> Dict:
-        parsed = sqlparse.parse(sql or "")
-        upper = (sql or "").upper()
 
-        # Extract table names from FROM and JOIN clauses
-        tables = []
-        tokens = upper.split()
-        for i, token in enumerate(tokens):
-            if token in ("FROM", "JOIN") and i + 1 < len(tokens):
-                # Get next token and clean it
-                next_token = tokens[i + 1]
-                # Remove common SQL keywords and punctuation
-                table = next_token.strip(",()").split()[0]
-                # Handle aliases (e.g., "orders o" -> "orders")
-                if table and table not in (
-                    "SELECT",
-                    "WHERE",
-                    "ON",
-                    "INNER",
-                    "LEFT",
-                    "RIGHT",
-                    "OUTER",
-                ):
-                    tables.append(table.lower())
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _analyze(sql: str) -> tuple:
+    """(has_join, has_aggregation, has_sort, has_subquery, tables) for a query"""
+    upper = (sql or "").upper()
+
+    # Extract table names from FROM and JOIN clauses
+    tables = []
+    tokens = upper.split()
+    for i, token in enumerate(tokens):
+        if token in ("FROM", "JOIN") and i + 1 < len(tokens):
+            # Get next token and clean it
+            next_token = tokens[i + 1]
+            # Remove common SQL keywords and punctuation
+            table = next_token.strip(",()").split()[0]
+            # Handle aliases (e.g., "orders o" -> "orders")
+            if table and table not in (
+                "SELECT",
+                "WHERE",
+                "ON",
+                "INNER",
+                "LEFT",
+                "RIGHT",
+                "OUTER",
+            ):
+                tables.append(table.lower())
+
+    return (
+        " JOIN " in upper,
+        any(k in upper for k in [" SUM(", " COUNT(", " AVG(", " GROUP BY "]),
+        " ORDER BY " in upper,
+        # A second SELECT, searched for in place rather than in a copy
+        upper.find("SELECT", upper.find("SELECT") + 6) != -1,
+        tuple(dict.fromkeys(tables)),  # Remove duplicates, keeping query order
+    )
 
+
+class QueryAnalyzer:
+    def analyze(self, sql: str) -> Dict:
+        # The same query text comes back on every compile and explain, so
+        # the work is cached and only the dict is built per call
+        has_join, has_aggregation, has_sort, has_subquery, tables = _analyze(sql)
         return {
-            "has_join": " JOIN " in upper,
-            "has_aggregation": any(
-                k in upper for k in [" SUM(", " COUNT(", " AVG(", " GROUP BY "]
-            ),
-            "has_sort": " ORDER BY " in upper,
-            "has_subquery": "SELECT" in upper[upper.find("SELECT") + 6 :].upper(),
-            "tables": list(set(tables)),  # Remove duplicates
+            "has_join": has_join,
+            "has_aggregation": has_aggregation,
+            "has_sort": has_sort,
+            "has_subquery": has_subquery,
+            "tables": list(tables),
             "estimated_selectivity": 0.5,
             "complexity_score": 50.0,
         }
@@ -21,3 +21,9 @@ def test_variants_exist_and_scaled():
         v[ExecutionStrategy.EFFICIENT].estimated_energy
         < v[ExecutionStrategy.BALANCED].estimated_energy
     )
+
+
+def test_trivial_query_keeps_every_strategy():
+    v = MultiVariantCompiler().compile("SELECT 1")
+    assert set(v) == set(ExecutionStrategy)
+    assert v[ExecutionStrategy.FAST].sql == "SELECT 1"
@@ -1,4 +1,4 @@
-﻿from src.utils.query_parser import QueryAnalyzer
+﻿from src.utils.query_parser import QueryAnalyzer, _analyze
 
 
 def test_analyze_flags_and_tables():
@@ -16,3 +16,14 @@ def test_subquery_detection():
     sql = "SELECT * FROM t WHERE id IN (SELECT id FROM u)"
     out = a.analyze(sql)
     assert out["has_subquery"]
+
+
+def test_repeat_analysis_is_cached_and_independent():
+    _analyze.cache_clear()
+    a = QueryAnalyzer()
+    sql = "SELECT * FROM orders o JOIN customers c ON o.cid=c.id"
+    first = a.analyze(sql)
+    first["tables"].append("mutated")
+    second = a.analyze(sql)
+    assert _analyze.cache_info().hits == 1
+    assert sorted(second["tables"]) == ["customers", "orders"]
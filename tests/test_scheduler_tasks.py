@@ -0,0 +1,61 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("celery")
+
+# A file URL, since the module-level engine's pool options reject :memory:
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/test_scheduler_worker.db"
+)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.db.models import Base, QueryExecution, QueryStatusEnum, ScheduledQuery
+from src.scheduler import tasks
+
+
+class _FailingEngine:
+    def execute_query(self, **kwargs):
+        raise RuntimeError("database unavailable")
+
+
+def test_run_scheduled_failure_backs_off(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    @contextmanager
+    def db_context():
+        with Session(engine) as db:
+            yield db
+            db.commit()
+
+    monkeypatch.setattr(tasks, "get_db_context", db_context)
+    monkeypatch.setattr(tasks, "_query_engine", _FailingEngine)
+
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        query_exec = QueryExecution(query_text="SELECT 1")
+        db.add(
+            ScheduledQuery(
+                query_execution=query_exec, scheduled_for=now, claimed_at=now
+            )
+        )
+        db.commit()
+
+    tasks.run_scheduled(1)
+
+    with Session(engine) as db:
+        scheduled = db.get(ScheduledQuery, 1)
+        assert scheduled.query_execution.status == QueryStatusEnum.FAILED
+        assert scheduled.claimed_at is None
+        assert scheduled.execution_attempts == 1
+        # Not due again right away, so retries are spread out
+        assert scheduled.scheduled_for >= now + timedelta(
+            seconds=2 * tasks.MIN_RETRY_SECONDS
+        )
+        assert not scheduled.is_executed
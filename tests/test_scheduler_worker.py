@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("loguru")
+pytest.importorskip("apscheduler")
+pytest.importorskip("celery")
+
+# A file URL, since the module-level engine's pool options reject :memory:
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/test_scheduler_worker.db"
+)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.db.models import Base, ScheduledQuery
+
+
+def _load_worker():
+    # The worker imports its siblings relative to the src package
+    path = Path(__file__).resolve().parents[1] / "scheduler" / "worker.py"
+    spec = importlib.util.spec_from_file_location("src.scheduler._worker", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_process_batch_with_nothing_due():
+    worker_module = _load_worker()
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    worker = worker_module.QuerySchedulerWorker.__new__(
+        worker_module.QuerySchedulerWorker
+    )
+    with Session(engine) as db:
+        assert worker.process_batch(db, datetime.utcnow()) == 0
+
+
+def test_next_poll_interval_caps_long_idle_backoff():
+    worker_module = _load_worker()
+    worker = worker_module.QuerySchedulerWorker.__new__(
+        worker_module.QuerySchedulerWorker
+    )
+    worker.consecutive_empty_polls = 0
+
+    # Days of empty polls; the exponent must not outgrow a float
+    for _ in range(2_000):
+        interval = worker.next_poll_interval(0)
+    assert interval == worker_module.FALLBACK_POLL_SECONDS
+    assert worker.next_poll_interval(1) == worker_module.MIN_POLL_SECONDS
+
+
+def test_process_batch_backs_off_when_the_queue_is_down(monkeypatch):
+    worker_module = _load_worker()
+
+    def unreachable():
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(
+        worker_module, "celery_app", SimpleNamespace(producer_or_acquire=unreachable)
+    )
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    worker = worker_module.QuerySchedulerWorker.__new__(
+        worker_module.QuerySchedulerWorker
+    )
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        db.add(ScheduledQuery(scheduled_for=now - timedelta(minutes=1)))
+        db.commit()
+
+        # Nothing reached the queue, and the row is not due again right away
+        assert worker.process_batch(db, now) == 0
+        scheduled = db.get(ScheduledQuery, 1)
+        assert scheduled.claimed_at is None
+        assert scheduled.scheduled_for > now
+        assert worker.process_batch(db, now) == 0